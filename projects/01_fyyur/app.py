@@ -3,8 +3,7 @@
 #----------------------------------------------------------------------------#
 import sys
 import json
-import dateutil.parser
-import babel
+from itertools import groupby
 
 from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
 from flask_moment import Moment
@@ -30,17 +29,19 @@ migrate = Migrate(app, db)
 # Models.
 #----------------------------------------------------------------------------#
 from models import Artist, Venue, Show
+from queries import venue_listing_query, show_counts, venue_shows, artist_shows, search, page_count
+from queries import keyset_page, decode_cursor, bulk_delete, show_listing_query, PAGE_SIZE
+from cache import page_cache, invalidate_deleted
+from importer import import_data_command
+from explain import check_indexes_command
+
+page_cache.init_app(app)
+app.cli.add_command(import_data_command)
+app.cli.add_command(check_indexes_command)
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
-
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+from filters import format_datetime
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -57,68 +58,49 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@page_cache.cached('venues')
 def venues():
-  data = []
-  regions = Venue.query.with_entities(Venue.city, Venue.state).group_by(Venue.city, Venue.state).all()
-  
-  for region in regions:
-    venues = Venue.query.filter_by(state = region.state).filter_by(city = region.city).all()
-    venue_data = []
-
-    for venue in venues:
-      venue_data.append({
-        'id': venue.id,
-        'name': venue.name
-      })
+  # one ordered pass over all venues, each row already carrying its
+  # upcoming show count, grouped into regions on the python side
+  rows = venue_listing_query(datetime.now()).all()
 
+  data = []
+  for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
     data.append({
-      'city': region.city,
-      'state': region.state,
-      'venues': venue_data
+      'city': city,
+      'state': state,
+      'venues': [{
+        'id': venue.id,
+        'name': venue.name,
+        'num_upcoming_shows': venue.num_upcoming_shows
+      } for venue in venues]
     })
   return render_template('pages/venues.html', areas=data)
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-  search_string = request.form.get('search_term')
-  print(search_string)
-  results = Venue.query.filter(Venue.name.ilike('%' + search_string + '%')).all()
-  
-  data = []
-  for result in results:
-    data.append({
-      'id': result.id,
-      'name': result.name
-    })
+  search_string = request.form.get('search_term', '')
+  count, data = search(Venue, search_string)
 
   response={
-    "count": len(results),
+    "count": count,
     "data": data
   }
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/venues/<int:venue_id>')
+@page_cache.cached('venue', 'venue:{venue_id}')
 def show_venue(venue_id):
   venue = Venue.query.get(venue_id)
-  shows = Show.query.filter_by(venue_id = venue.id).join(Artist).all()
-
-  past_shows = []
-  upcoming_shows = []
-  for show in shows:
-    if show.date > datetime.now():
-      upcoming_shows.append({
-        'artist_id': show.artists.id,
-        'artist_name': show.artists.name,
-        'artist_image_link': show.artists.image_link,
-        'start_time': str(show.date)
-      })
-    else:
-      past_shows.append({
-        'artist_id': show.artists.id,
-        'artist_name': show.artists.name,
-        'artist_image_link': show.artists.image_link,
-        'start_time': str(show.date)
-      })
+  if venue is None:
+    abort(404)
+
+  now = datetime.now()
+  past_shows_count, upcoming_shows_count = show_counts(Show.venue_id, venue.id, now)
+  past_page = max(request.args.get('past_page', 1, type=int), 1)
+  upcoming_page = max(request.args.get('upcoming_page', 1, type=int), 1)
+  past_shows = venue_shows(venue.id, upcoming=False, now=now, page=past_page)
+  upcoming_shows = venue_shows(venue.id, upcoming=True, now=now, page=upcoming_page)
 
   data = {
     'id': venue.id,
@@ -135,8 +117,12 @@ def show_venue(venue_id):
     'image_link': venue.image_link,
     'past_shows': past_shows,
     'upcoming_shows': upcoming_shows,
-    'past_shows_count': len(past_shows),
-    'upcoming_shows_count': len(upcoming_shows)
+    'past_shows_count': past_shows_count,
+    'upcoming_shows_count': upcoming_shows_count,
+    'past_page': past_page,
+    'past_pages': page_count(past_shows_count),
+    'upcoming_page': upcoming_page,
+    'upcoming_pages': page_count(upcoming_shows_count)
   }
 
   return render_template('pages/show_venue.html', venue=data)
@@ -187,16 +173,13 @@ def create_venue_submission():
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
     return render_template('pages/home.html')
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
   error = False
+  deleted = 0
   body = {}
   try:
-    shows = Show.query.filter_by(venue_id = venue_id).all()
-    venue = Venue.query.get(venue_id)
-    for show in shows:
-      db.session.delete(show)
-    db.session.delete(venue)
+    deleted = bulk_delete(Venue, [venue_id])
     db.session.commit()
     body['url'] = url_for('index')
   except:
@@ -204,62 +187,58 @@ def delete_venue(venue_id):
     db.session.rollback()
     print(sys.exc_info())
   finally:
-    print('perfect')
     db.session.close()
 
   if error:
     flash('An error occurred: Venue could not be deleted!')
     abort(500)
+  elif not deleted:
+    abort(404)
   else:
+    invalidate_deleted(Venue, [venue_id])
     flash('Venue was successfully deleted!')
-    print('here')
     return jsonify(body)
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@page_cache.cached('artists')
 def artists():
-  return render_template('pages/artists.html', artists=Artist.query.all())
+  page = keyset_page(
+    Artist.query.with_entities(Artist.id, Artist.name),
+    (Artist.name, Artist.id),
+    after=decode_cursor(request.args.get('after'), str, int),
+    before=decode_cursor(request.args.get('before'), str, int),
+    per_page=request.args.get('per_page', PAGE_SIZE, type=int)
+  )
+  return render_template('pages/artists.html', artists=page['rows'],
+                         prev_cursor=page['prev'], next_cursor=page['next'],
+                         per_page=request.args.get('per_page', type=int))
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-  search_string = request.form.get('search_term')
-  results = Artist.query.filter(Artist.name.ilike('%' + search_string + '%')).all()
+  search_string = request.form.get('search_term', '')
+  count, data = search(Artist, search_string)
 
-  data = []
-  for result in results:
-    data.append({
-      'id': result.id,
-      'name': result.name
-    })
   response={
-    "count": len(results),
+    "count": count,
     "data": data
   }
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/artists/<int:artist_id>')
+@page_cache.cached('artist', 'artist:{artist_id}')
 def show_artist(artist_id):
   artist = Artist.query.get(artist_id)
-  shows = Show.query.filter_by(artist_id = artist.id).join(Venue).all()
-
-  past_shows = []
-  upcoming_shows = []
-  for show in shows:
-    if show.date > datetime.now():
-      upcoming_shows.append({
-        'venue_id': show.venues.id,
-        'venue_name': show.venues.name,
-        'venue_image_link': show.venues.image_link,
-        'start_time': str(show.date)
-      })
-    else:
-      past_shows.append({
-        'venue_id': show.venues.id,
-        'venue_name': show.venues.name,
-        'venue_image_link': show.venues.image_link,
-        'start_time': str(show.date)
-      })
+  if artist is None:
+    abort(404)
+
+  now = datetime.now()
+  past_shows_count, upcoming_shows_count = show_counts(Show.artist_id, artist.id, now)
+  past_page = max(request.args.get('past_page', 1, type=int), 1)
+  upcoming_page = max(request.args.get('upcoming_page', 1, type=int), 1)
+  past_shows = artist_shows(artist.id, upcoming=False, now=now, page=past_page)
+  upcoming_shows = artist_shows(artist.id, upcoming=True, now=now, page=upcoming_page)
 
   data = {
     'id': artist.id,
@@ -275,13 +254,44 @@ def show_artist(artist_id):
     'seeking_description': artist.seeking_description,
     'past_shows': past_shows,
     'upcoming_shows': upcoming_shows,
-    'past_shows_count': len(past_shows),
-    'upcoming_shows_count': len(upcoming_shows)
+    'past_shows_count': past_shows_count,
+    'upcoming_shows_count': upcoming_shows_count,
+    'past_page': past_page,
+    'past_pages': page_count(past_shows_count),
+    'upcoming_page': upcoming_page,
+    'upcoming_pages': page_count(upcoming_shows_count)
   }
   
   return render_template('pages/show_artist.html', artist=data)
 
 
+@app.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+  error = False
+  deleted = 0
+  body = {}
+  try:
+    deleted = bulk_delete(Artist, [artist_id])
+    db.session.commit()
+    body['url'] = url_for('index')
+  except:
+    error = True
+    db.session.rollback()
+    print(sys.exc_info())
+  finally:
+    db.session.close()
+
+  if error:
+    flash('An error occurred: Artist could not be deleted!')
+    abort(500)
+  elif not deleted:
+    abort(404)
+  else:
+    invalidate_deleted(Artist, [artist_id])
+    flash('Artist was successfully deleted!')
+    return jsonify(body)
+
+
 #  ----------------------------------------------------------------
 #  Update
 #  ----------------------------------------------------------------
@@ -421,21 +431,30 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@page_cache.cached('shows')
 def shows():
-  shows = Show.query.join(Artist).join(Venue).all()
+  page = keyset_page(
+    show_listing_query(),
+    (Show.date, Show.id),
+    after=decode_cursor(request.args.get('after'), datetime.fromisoformat, int),
+    before=decode_cursor(request.args.get('before'), datetime.fromisoformat, int),
+    per_page=request.args.get('per_page', PAGE_SIZE, type=int)
+  )
 
   data = []
-  for show in shows:
+  for show in page['rows']:
     data.append({
-      'venue_id': show.venues.id,
-      'venue_name': show.venues.name,
-      'artist_id': show.artists.id,
-      'artist_name': show.artists.name,
-      'artist_image_link': show.artists.image_link,
-      'start_time': str(show.date)
+      'venue_id': show.venue_id,
+      'venue_name': show.venue_name,
+      'artist_id': show.artist_id,
+      'artist_name': show.artist_name,
+      'artist_image_link': show.artist_image_link,
+      'start_time': show.date
     })
 
-  return render_template('pages/shows.html', shows=data)
+  return render_template('pages/shows.html', shows=data,
+                         prev_cursor=page['prev'], next_cursor=page['next'],
+                         per_page=request.args.get('per_page', type=int))
 
 @app.route('/shows/create')
 def create_shows():
@@ -470,6 +489,27 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+@app.route('/stats/cache')
+def cache_stats():
+  return jsonify(page_cache.stats())
+
+@app.route('/stats/pool')
+def pool_stats():
+  pool = db.engine.pool
+  size = app.config['DB_POOL_SIZE']
+  max_overflow = app.config['DB_MAX_OVERFLOW']
+  # DB_POOL_SIZE=0 means no limit, there is nothing to divide by
+  limit = size + max_overflow
+  return jsonify({
+    'size': size,
+    'max_overflow': max_overflow,
+    'checked_out': pool.checkedout(),
+    'checked_in': pool.checkedin(),
+    'overflow': max(pool.overflow(), 0),
+    'utilization': pool.checkedout() / limit if limit > 0 else None
+  })
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,207 @@
+import time
+from threading import Lock
+from functools import wraps
+from collections import OrderedDict
+
+from flask import request, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Artist, Venue, Show
+
+#----------------------------------------------------------------------------#
+# Stores.
+#----------------------------------------------------------------------------#
+
+class LRUStore(object):
+  '''
+  in-process LRU store with per-entry expiry. it exposes the small subset
+  of the redis client api the page cache needs (get, set with `ex`, incr),
+  so it doubles as the local stand-in for a shared store.
+  '''
+
+  def __init__(self, maxsize=512):
+    self.maxsize = maxsize
+    self.evictions = 0
+    self._data = OrderedDict()
+    # counters (tag versions) are never evicted, losing one would
+    # resurrect pages rendered under an older version
+    self._counters = {}
+    self._lock = Lock()
+
+  def get(self, key):
+    with self._lock:
+      if key in self._counters:
+        return self._counters[key]
+      item = self._data.get(key)
+      if item is None:
+        return None
+      value, expires = item
+      if expires is not None and expires < time.time():
+        del self._data[key]
+        return None
+      self._data.move_to_end(key)
+      return value
+
+  def set(self, key, value, ex=None):
+    with self._lock:
+      expires = time.time() + ex if ex else None
+      self._data[key] = (value, expires)
+      self._data.move_to_end(key)
+      while len(self._data) > self.maxsize:
+        self._data.popitem(last=False)
+        self.evictions += 1
+
+  def incr(self, key):
+    with self._lock:
+      self._counters[key] = self._counters.get(key, 0) + 1
+      return self._counters[key]
+
+  def __len__(self):
+    return len(self._data)
+
+
+def create_store(app):
+  '''
+  shared redis store when CACHE_REDIS_URL is configured (and the redis
+  package is installed), the in-process LRUStore otherwise.
+  '''
+  url = app.config.get('CACHE_REDIS_URL')
+  if url:
+    try:
+      import redis
+      return redis.Redis.from_url(url)
+    except ImportError:
+      app.logger.warning('redis is not installed, using the local page cache')
+  return LRUStore(app.config.get('CACHE_MAX_ENTRIES', 512))
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+class PageCache(object):
+  '''
+  caches rendered pages under their url. every page is tagged (e.g. 'venues',
+  'venue:1') and the key embeds the current version of each tag, so
+  invalidating a tag is a single version bump that orphans every page
+  rendered with the old version; orphans then age out of the store.
+  '''
+
+  def __init__(self):
+    self.store = None
+    self.ttl = None
+    self.hits = 0
+    self.misses = 0
+    self.invalidations = 0
+
+  def init_app(self, app):
+    self.store = create_store(app)
+    self.ttl = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    if app.config.get('CACHE_DISABLED'):
+      self.store = None
+
+  def _version(self, tag):
+    return int(self.store.get('tag:' + tag) or 0)
+
+  def _key(self, tags):
+    versions = ','.join('{}={}'.format(tag, self._version(tag)) for tag in tags)
+    return 'page:{}|{}'.format(request.full_path, versions)
+
+  def invalidate(self, *tags):
+    if self.store is None:
+      return
+    for tag in tags:
+      self.store.incr('tag:' + tag)
+    self.invalidations += 1
+
+  def cached(self, *tags):
+    '''
+    view decorator. tags are strings formatted with the view arguments,
+    e.g. @page_cache.cached('venue', 'venue:{venue_id}')
+    '''
+    def decorator(f):
+      @wraps(f)
+      def wrapper(*args, **kwargs):
+        # a pending flash message would be baked into (or hidden by) the page
+        if self.store is None or session.get('_flashes'):
+          return f(*args, **kwargs)
+
+        key = self._key([tag.format(**kwargs) for tag in tags])
+        page = self.store.get(key)
+        if page is not None:
+          self.hits += 1
+          return page.decode() if isinstance(page, bytes) else page
+
+        self.misses += 1
+        page = f(*args, **kwargs)
+        if isinstance(page, str):
+          self.store.set(key, page, ex=self.ttl)
+        return page
+      return wrapper
+    return decorator
+
+  def stats(self):
+    lookups = self.hits + self.misses
+    stats = {
+      'hits': self.hits,
+      'misses': self.misses,
+      'hit_rate': self.hits / lookups if lookups else 0.0,
+      'invalidations': self.invalidations
+    }
+    if isinstance(self.store, LRUStore):
+      stats['entries'] = len(self.store)
+      stats['evictions'] = self.store.evictions
+    return stats
+
+
+page_cache = PageCache()
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+def tags_for(instance):
+  '''cache tags of the pages that render `instance`'''
+  if isinstance(instance, Show):
+    return {
+      'venues', 'shows',
+      'venue:{}'.format(instance.venue_id),
+      'artist:{}'.format(instance.artist_id)
+    }
+  if isinstance(instance, Venue):
+    # artist pages show the venue's name and image next to each show
+    return {'venues', 'shows', 'artist', 'venue:{}'.format(instance.id)}
+  if isinstance(instance, Artist):
+    return {'artists', 'shows', 'venue', 'artist:{}'.format(instance.id)}
+  return set()
+
+
+def invalidate_deleted(model, ids):
+  '''
+  bulk deletes (queries.bulk_delete) bypass the session events,
+  so their callers invalidate the affected pages after the commit
+  '''
+  tags = set()
+  for id in ids:
+    tags |= tags_for(model(id=id))
+  page_cache.invalidate(*tags)
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_tags(db_session, flush_context):
+  tags = db_session.info.setdefault('page_cache_tags', set())
+  changed = list(db_session.new) + list(db_session.dirty) + list(db_session.deleted)
+  for instance in changed:
+    tags |= tags_for(instance)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_tags(db_session):
+  tags = db_session.info.pop('page_cache_tags', None)
+  if tags:
+    page_cache.invalidate(*tags)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_tags(db_session, previous_transaction):
+  db_session.info.pop('page_cache_tags', None)
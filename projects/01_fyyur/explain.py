@@ -0,0 +1,68 @@
+import sys
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+
+from models import db, Artist, Venue, Show
+from queries import venue_listing_query, show_counts_query, shows_query
+from queries import show_listing_query, keyset_query
+
+#----------------------------------------------------------------------------#
+# Hot queries.
+#----------------------------------------------------------------------------#
+
+def hot_queries(now):
+  '''(description, query, index its plan must use) of the pages' hot queries'''
+  # id 0 is never assigned, so the planner treats it like a typical, selective
+  # id instead of one that happens to own most of the rows
+  id = 0
+  return [
+    ('venue listing', venue_listing_query(now), 'ix_shows_venue_id_date'),
+    ('venue show counts', show_counts_query(Show.venue_id, id, now), 'ix_shows_venue_id_date'),
+    ('venue upcoming shows', shows_query(Show.venue_id, id, Artist, True, now), 'ix_shows_venue_id_date'),
+    ('venue past shows', shows_query(Show.venue_id, id, Artist, False, now), 'ix_shows_venue_id_date'),
+    ('artist show counts', show_counts_query(Show.artist_id, id, now), 'ix_shows_artist_id_date'),
+    ('artist upcoming shows', shows_query(Show.artist_id, id, Venue, True, now), 'ix_shows_artist_id_date'),
+    ('artist past shows', shows_query(Show.artist_id, id, Venue, False, now), 'ix_shows_artist_id_date'),
+    ('venues in a region', Venue.query.filter_by(city='San Francisco', state='CA'), 'ix_venues_city_state'),
+    ('shows page', keyset_query(show_listing_query(), (Show.date, Show.id), after=(now, id)), 'ix_shows_keyset'),
+    ('artists page', keyset_query(Artist.query.with_entities(Artist.id, Artist.name),
+                                  (Artist.name, Artist.id), after=('', id)), 'ix_artists_keyset')
+  ]
+
+
+def explain(query):
+  '''postgres query plan of an orm query, as a list of lines'''
+  statement = query.statement.compile(dialect=db.engine.dialect)
+  result = db.session.connection().execute('EXPLAIN ' + str(statement), statement.params)
+  return [line for line, in result]
+
+#----------------------------------------------------------------------------#
+# Command.
+#----------------------------------------------------------------------------#
+
+@click.command('check-indexes')
+@click.option('--verbose', is_flag=True, help='Print every query plan.')
+@with_appcontext
+def check_indexes_command(verbose):
+  '''
+  Fail unless the hot venue/artist/show queries can be served by their
+  indexes. Sequential scans are disabled for the check, so the result does
+  not depend on how much data the database holds.
+  '''
+  missing = 0
+  try:
+    db.session.execute('SET LOCAL enable_seqscan = off')
+    for description, query, index in hot_queries(datetime.now()):
+      plan = explain(query)
+      used = any(index in line for line in plan)
+      missing += not used
+      click.echo('{:<24}{:<26}{}'.format(description, index, 'ok' if used else 'NOT USED'))
+      if verbose or not used:
+        click.echo('\n'.join('    ' + line for line in plan))
+  finally:
+    db.session.rollback()
+
+  if missing:
+    sys.exit(1)
@@ -0,0 +1,95 @@
+from datetime import datetime
+from functools import lru_cache
+
+import babel.dates
+import dateutil.parser
+
+# named patterns accepted by the `datetime` template filter,
+# any other format is used as a babel pattern as is
+FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+@lru_cache(maxsize=None)
+def _compiled(format, locale):
+  '''babel pattern and locale, parsed once per (format, locale)'''
+  pattern = babel.dates.parse_pattern(FORMATS.get(format, format))
+  return pattern, babel.Locale.parse(locale or babel.dates.LC_TIME)
+
+
+@lru_cache(maxsize=4096)
+def _parse(value):
+  return dateutil.parser.parse(value)
+
+
+@lru_cache(maxsize=4096)
+def _format(value, format, locale):
+  pattern, locale = _compiled(format, locale)
+  if value.tzinfo is None:
+    # babel.dates.format_datetime treats naive datetimes as UTC
+    value = value.replace(tzinfo=babel.dates.UTC)
+  return pattern.apply(value, locale)
+
+
+def format_datetime(value, format='medium', locale=None):
+  '''
+  `datetime` template filter. takes a datetime (or a string dateutil can
+  parse) and formats it with a named or babel pattern. patterns are compiled
+  once and the formatted strings of recently seen values are memoized,
+  since listings repeat the same show dates over and over.
+  '''
+  if not isinstance(value, datetime):
+    value = _parse(value)
+  return _format(value, format, locale)
+
+#----------------------------------------------------------------------------#
+# Benchmark.
+#----------------------------------------------------------------------------#
+
+def benchmark(shows=10000, repeat=5):
+  '''
+  per-call cost of formatting the start times of a `shows` long listing,
+  the old parse-and-format-every-cell filter vs format_datetime.
+  run with: python filters.py
+  '''
+  import timeit
+  from datetime import timedelta
+
+  # a busy listing: many shows share the same handful of time slots
+  start = datetime(2020, 5, 21, 21, 30)
+  dates = [start + timedelta(days=i % 365, hours=i % 3) for i in range(shows)]
+  strings = [str(date) for date in dates]
+
+  def uncached():
+    for value in strings:
+      babel.dates.format_datetime(dateutil.parser.parse(value), FORMATS['full'])
+
+  def cold_datetimes():
+    # compiled pattern but nothing memoized yet: first render after a restart
+    _format.cache_clear()
+    for value in dates:
+      format_datetime(value, 'full')
+
+  def cached_strings():
+    for value in strings:
+      format_datetime(value, 'full')
+
+  def cached_datetimes():
+    for value in dates:
+      format_datetime(value, 'full')
+
+  for name, run in [('parse + babel per call', uncached),
+                    ('format_datetime, cold', cold_datetimes),
+                    ('format_datetime(str)', cached_strings),
+                    ('format_datetime(datetime)', cached_datetimes)]:
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    print('{:<28}{:>10.2f} us/call'.format(name, best / shows * 1e6))
+
+
+if __name__ == '__main__':
+  benchmark()
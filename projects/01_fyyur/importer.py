@@ -0,0 +1,231 @@
+import os
+import csv
+import sys
+import json
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+
+from models import db, Artist, Venue, Show
+from forms import VenueForm, ArtistForm, ShowForm
+from cache import page_cache
+
+# rows validated and inserted per transaction
+BATCH_SIZE = 1000
+
+#----------------------------------------------------------------------------#
+# Rows.
+#----------------------------------------------------------------------------#
+
+def venue_values(data):
+  return {
+    'name': data['name'],
+    'city': data['city'],
+    'state': data['state'],
+    'address': data['address'],
+    'phone': data['phone'],
+    'genres': data['genres'],
+    'image_link': data['image_link'],
+    'facebook_link': data['facebook_link'],
+    'website': data['website'],
+    'seeking_talent': data['seeking_talent'] == 'True',
+    'seeking_description': data['seeking_description']
+  }
+
+
+def artist_values(data):
+  return {
+    'name': data['name'],
+    'city': data['city'],
+    'state': data['state'],
+    'phone': data['phone'],
+    'genres': data['genres'],
+    'image_link': data['image_link'],
+    'facebook_link': data['facebook_link'],
+    'website': data['website'],
+    'seeking_venue': data['seeking_venue'] == 'True',
+    'seeking_description': data['seeking_description']
+  }
+
+
+def show_values(data):
+  return {
+    'artist_id': int(data['artist_id']),
+    'venue_id': int(data['venue_id']),
+    'date': data['start_time']
+  }
+
+
+# kind: (model, form validating a row, form data -> column values, cache tags)
+KINDS = {
+  'venues': (Venue, VenueForm, venue_values, ('venues',)),
+  'artists': (Artist, ArtistForm, artist_values, ('artists',)),
+  'shows': (Show, ShowForm, show_values, ('venues', 'venue', 'artist', 'shows'))
+}
+
+
+# fields every record must carry itself. the forms fill some fields in
+# (ShowForm.start_time defaults to when forms.py was imported), so a
+# record missing them would otherwise pass validation.
+REQUIRED_FIELDS = {
+  'venues': ('name', 'city', 'state', 'address', 'genres'),
+  'artists': ('name', 'city', 'state', 'genres'),
+  'shows': ('artist_id', 'venue_id', 'start_time')
+}
+
+
+def read_rows(path):
+  '''
+  stream the records of a .csv or .jsonl file as MultiDicts, the shape the
+  forms read submitted data from. csv genres are a comma separated list.
+  '''
+  with open(path, newline='') as f:
+    if path.endswith('.csv'):
+      for row in csv.DictReader(f):
+        data = MultiDict(row)
+        if 'genres' in row:
+          data.setlist('genres', [g.strip() for g in row['genres'].split(',') if g.strip()])
+        yield data
+    else:
+      for line in f:
+        if not line.strip():
+          continue
+        record = json.loads(line)
+        data = MultiDict()
+        for key, value in record.items():
+          if isinstance(value, list):
+            data.setlist(key, [str(v) for v in value])
+          elif value is not None:
+            data[key] = str(value)
+        yield data
+
+
+def validate(form_class, to_values, data, required=()):
+  '''(column values, None) for a valid row, (None, form errors) otherwise'''
+  missing = [field for field in required
+             if not any(value.strip() for value in data.getlist(field))]
+  if missing:
+    return None, {field: ['This field is required.'] for field in missing}
+
+  form = form_class(formdata=data, meta={'csrf': False})
+  if not form.validate():
+    return None, form.errors
+  try:
+    return to_values(form.data), None
+  except (KeyError, ValueError) as e:
+    return None, {'row': [str(e)]}
+
+#----------------------------------------------------------------------------#
+# Checkpoints.
+#----------------------------------------------------------------------------#
+
+def load_checkpoint(path):
+  '''number of records already imported by an interrupted run'''
+  if not os.path.exists(path):
+    return 0
+  with open(path) as f:
+    return json.load(f)['done']
+
+
+def save_checkpoint(path, done):
+  # write then rename, so a crash never leaves a torn checkpoint behind
+  with open(path + '.tmp', 'w') as f:
+    json.dump({'done': done}, f)
+  os.replace(path + '.tmp', path)
+
+#----------------------------------------------------------------------------#
+# Import.
+#----------------------------------------------------------------------------#
+
+def insert_batch(table, values):
+  '''
+  insert a batch with one executemany. if the batch is rejected (e.g. a
+  show pointing at a missing venue) fall back to row by row inserts so only
+  the offending rows are lost. returns the (row index, error) failures.
+  '''
+  try:
+    db.session.execute(table.insert(), values)
+    db.session.commit()
+    return []
+  except Exception:
+    db.session.rollback()
+
+  failures = []
+  for index, row in enumerate(values):
+    try:
+      db.session.execute(table.insert(), [row])
+      db.session.commit()
+    except Exception as e:
+      db.session.rollback()
+      failures.append((index, str(getattr(e, 'orig', e)).strip()))
+  return failures
+
+
+def import_file(kind, path, batch_size=BATCH_SIZE, checkpoint=None, echo=click.echo):
+  '''
+  import the records of `path` in batches of `batch_size`, recording the
+  number of processed records in `checkpoint` after every committed batch
+  so an interrupted import resumes where it stopped.
+  returns (imported, rejected)
+  '''
+  model, form_class, to_values, tags = KINDS[kind]
+  checkpoint = checkpoint or path + '.checkpoint'
+  done = load_checkpoint(checkpoint)
+  if done:
+    echo('resuming {} after record {}'.format(path, done))
+
+  rows = islice(read_rows(path), done, None)
+  imported = rejected = 0
+
+  while True:
+    batch = list(islice(rows, batch_size))
+    if not batch:
+      break
+
+    values, numbers = [], []
+    for offset, data in enumerate(batch):
+      number = done + offset + 1
+      row, errors = validate(form_class, to_values, data, REQUIRED_FIELDS[kind])
+      if errors:
+        rejected += 1
+        echo('record {}: {}'.format(number, errors), err=True)
+      else:
+        values.append(row)
+        numbers.append(number)
+
+    if values:
+      failures = insert_batch(model.__table__, values)
+      for index, error in failures:
+        echo('record {}: {}'.format(numbers[index], error), err=True)
+      imported += len(values) - len(failures)
+      rejected += len(failures)
+
+    done += len(batch)
+    save_checkpoint(checkpoint, done)
+    echo('{}: {} records processed, {} imported, {} rejected'.format(
+      kind, done, imported, rejected))
+
+  # inserts through the core api skip the session events the page cache
+  # listens to
+  page_cache.invalidate(*tags)
+  if os.path.exists(checkpoint):
+    os.remove(checkpoint)
+  return imported, rejected
+
+
+@click.command('import-data')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True,
+              help='Records validated and inserted per transaction.')
+@click.option('--checkpoint', default=None,
+              help='Progress file, defaults to PATH.checkpoint.')
+@with_appcontext
+def import_data_command(kind, path, batch_size, checkpoint):
+  '''Bulk import venues, artists or shows from a .csv or .jsonl file.'''
+  imported, rejected = import_file(kind, path, batch_size, checkpoint)
+  click.echo('done: {} imported, {} rejected'.format(imported, rejected))
+  if rejected:
+    sys.exit(1)
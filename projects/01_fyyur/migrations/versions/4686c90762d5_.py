@@ -0,0 +1,34 @@
+"""cascade show deletes from venues and artists
+
+Revision ID: 4686c90762d5
+Revises: d096d16dc4d6
+Create Date: 2020-07-26 11:47:35.912046
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4686c90762d5'
+down_revision = 'd096d16dc4d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'artists',
+                          ['artist_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'venues',
+                          ['venue_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'venues',
+                          ['venue_id'], ['id'])
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'artists',
+                          ['artist_id'], ['id'])
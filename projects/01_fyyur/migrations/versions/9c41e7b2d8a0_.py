@@ -0,0 +1,26 @@
+"""indexes on the keyset pagination keys of /shows and /artists
+
+Revision ID: 9c41e7b2d8a0
+Revises: f3cd5a8479c6
+Create Date: 2020-07-29 18:42:11.503217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c41e7b2d8a0'
+down_revision = 'f3cd5a8479c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_keyset', 'shows', ['date', 'id'], unique=False)
+    op.create_index('ix_artists_keyset', 'artists', ['name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artists_keyset', table_name='artists')
+    op.drop_index('ix_shows_keyset', table_name='shows')
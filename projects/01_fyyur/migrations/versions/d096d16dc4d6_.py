@@ -0,0 +1,32 @@
+"""trigram search indexes on venue and artist names
+
+Revision ID: d096d16dc4d6
+Revises: 56bcec9e4baf
+Create Date: 2020-07-25 14:02:11.408213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd096d16dc4d6'
+down_revision = '56bcec9e4baf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm lets ILIKE '%term%' and similarity() ranking use a GIN index
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venues_name_trgm', 'venues', ['name'], unique=False,
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artists_name_trgm', 'artists', ['name'], unique=False,
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artists_name_trgm', table_name='artists')
+    op.drop_index('ix_venues_name_trgm', table_name='venues')
@@ -0,0 +1,28 @@
+"""indexes for show lookups by venue/artist and date, venues by region
+
+Revision ID: f3cd5a8479c6
+Revises: 4686c90762d5
+Create Date: 2020-07-27 19:20:04.115730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3cd5a8479c6'
+down_revision = '4686c90762d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_venue_id_date', 'shows', ['venue_id', 'date'], unique=False)
+    op.create_index('ix_shows_artist_id_date', 'shows', ['artist_id', 'date'], unique=False)
+    op.create_index('ix_venues_city_state', 'venues', ['city', 'state'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venues_city_state', table_name='venues')
+    op.drop_index('ix_shows_artist_id_date', table_name='shows')
+    op.drop_index('ix_shows_venue_id_date', table_name='shows')
@@ -2,16 +2,26 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 
+import config
+
 db = SQLAlchemy()
 
-def create_app():
+def create_app(env=None):
     app = Flask(__name__)
-    app.config.from_object('config.config')
+    config.load(app, env)
     db.init_app(app)
     return app
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        # GIN trigram index backing name search, see queries.search()
+        db.Index('ix_venues_name_trgm', 'name',
+                 postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        # the /venues listing groups and orders by region
+        db.Index('ix_venues_city_state', 'city', 'state'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50))
@@ -25,7 +35,9 @@ class Venue(db.Model):
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='venues', lazy=True)
+    # shows are removed by the database (ON DELETE CASCADE), not loaded and deleted one by one
+    shows = db.relationship('Show', backref='venues', lazy=True,
+                            cascade='all, delete', passive_deletes=True)
 
     def __repr__(self):
         return '<venue: {}>'.format(self.name)
@@ -33,6 +45,14 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        # GIN trigram index backing name search, see queries.search()
+        db.Index('ix_artists_name_trgm', 'name',
+                 postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        # /artists pages seek on (name, id), see queries.keyset_page()
+        db.Index('ix_artists_keyset', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50))
@@ -45,7 +65,9 @@ class Artist(db.Model):
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='artists', lazy=True)
+    # shows are removed by the database (ON DELETE CASCADE), not loaded and deleted one by one
+    shows = db.relationship('Show', backref='artists', lazy=True,
+                            cascade='all, delete', passive_deletes=True)
 
     def __repr__(self):
         return '<artist: {}>'.format(self.name)
@@ -53,10 +75,17 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        # venue and artist pages look shows up by owner, split by date
+        db.Index('ix_shows_venue_id_date', 'venue_id', 'date'),
+        db.Index('ix_shows_artist_id_date', 'artist_id', 'date'),
+        # /shows pages seek on (date, id), see queries.keyset_page()
+        db.Index('ix_shows_keyset', 'date', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), nullable=False)
     date = db.Column(db.DateTime, nullable=False)
 
     def __repr__(self):
@@ -0,0 +1,221 @@
+import json
+import base64
+from datetime import datetime
+
+from models import db, Artist, Venue, Show
+
+# how many shows of each kind a venue/artist page lists at once
+SHOWS_PER_PAGE = 20
+# default and maximum page sizes of the paginated listings (/shows, /artists)
+PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+def encode_cursor(key):
+  '''opaque, url safe cursor for a sort key tuple such as (date, id)'''
+  values = [v.isoformat() if isinstance(v, datetime) else v for v in key]
+  return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, *types):
+  '''
+  inverse of encode_cursor, `types` converts each value back
+  (e.g. datetime.fromisoformat). returns None for a missing or malformed cursor.
+  '''
+  if not cursor:
+    return None
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(values, list) or len(values) != len(types):
+      return None
+    return tuple(convert(value) for convert, value in zip(types, values))
+  except (ValueError, TypeError):
+    return None
+
+
+def keyset_query(query, keys, after=None, before=None, per_page=PAGE_SIZE):
+  '''
+  `query` filtered and ordered to fetch one keyset page (plus one row to
+  tell whether there is another). an index on `keys` serves it as a
+  range scan, see the ix_*_keyset indexes of the models.
+  '''
+  if before is not None:
+    query = query.filter(db.tuple_(*keys) < db.tuple_(*before)) \
+                 .order_by(*[key.desc() for key in keys])
+  else:
+    if after is not None:
+      query = query.filter(db.tuple_(*keys) > db.tuple_(*after))
+    query = query.order_by(*keys)
+  return query.limit(per_page + 1)
+
+
+def keyset_page(query, keys, after=None, before=None, per_page=PAGE_SIZE):
+  '''
+  one page of `query` ordered by the unique sort key `keys`
+  (e.g. (Show.date, Show.id)), seeking past the `after` key or back before
+  the `before` key instead of using OFFSET, so every page costs the same.
+  rows must expose the key columns under their own names.
+  returns {'rows', 'prev', 'next'} where prev/next are the cursors of the
+  neighbouring pages or None.
+  '''
+  per_page = min(max(per_page, 1), MAX_PAGE_SIZE)
+
+  rows = keyset_query(query, keys, after, before, per_page).all()
+  has_more = len(rows) > per_page
+  rows = rows[:per_page]
+  if before is not None:
+    rows.reverse()
+
+  def cursor(row):
+    return encode_cursor([getattr(row, key.key) for key in keys])
+
+  has_prev = has_more if before is not None else after is not None
+  has_next = has_more if before is None else True
+  return {
+    'rows': rows,
+    'prev': cursor(rows[0]) if rows and has_prev else None,
+    'next': cursor(rows[-1]) if rows and has_next else None
+  }
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+def venue_listing_query(now):
+  '''
+  every venue with its number of upcoming shows, ordered by region
+  so the /venues page can group consecutive rows
+  '''
+  upcoming_shows = db.and_(Show.venue_id == Venue.id, Show.date > now)
+  return Venue.query.with_entities(
+    Venue.id,
+    Venue.name,
+    Venue.city,
+    Venue.state,
+    db.func.count(Show.id).label('num_upcoming_shows')
+  ).outerjoin(Show, upcoming_shows) \
+   .group_by(Venue.id) \
+   .order_by(Venue.city, Venue.state, Venue.name)
+
+
+def show_counts_query(column, entity_id, now):
+  return Show.query.with_entities(
+    db.func.count(Show.id).filter(Show.date <= now),
+    db.func.count(Show.id).filter(Show.date > now)
+  ).filter(column == entity_id)
+
+
+def show_counts(column, entity_id, now=None):
+  '''
+  (past, upcoming) show counts for one venue or artist,
+  computed by a single aggregate query.
+  column: Show.venue_id or Show.artist_id
+  '''
+  past, upcoming = show_counts_query(column, entity_id, now or datetime.now()).one()
+  return past, upcoming
+
+
+def shows_query(column, entity_id, other, upcoming, now):
+  '''
+  past or upcoming shows of a venue or artist joined with the other side of
+  the show (the artist of a venue, the venue of an artist), selecting plain
+  columns so no ORM objects or lazy relationships are loaded.
+  '''
+  query = Show.query.with_entities(
+    Show.date,
+    other.id,
+    other.name,
+    other.image_link
+  ).join(other).filter(column == entity_id)
+
+  if upcoming:
+    return query.filter(Show.date > now).order_by(Show.date.asc(), Show.id)
+  return query.filter(Show.date <= now).order_by(Show.date.desc(), Show.id)
+
+
+def show_listing_query():
+  '''every show with its venue and artist, for the /shows pages'''
+  return Show.query.with_entities(
+    Show.id,
+    Show.date,
+    Venue.id.label('venue_id'),
+    Venue.name.label('venue_name'),
+    Artist.id.label('artist_id'),
+    Artist.name.label('artist_name'),
+    Artist.image_link.label('artist_image_link')
+  ).join(Artist).join(Venue)
+
+
+def page_count(total, per_page=SHOWS_PER_PAGE):
+  '''number of pages of `total` shows, at least one'''
+  return max((total + per_page - 1) // per_page, 1)
+
+
+def _shows(column, entity_id, other, upcoming, now, page, per_page):
+  page = max(page, 1)
+  return shows_query(column, entity_id, other, upcoming, now) \
+    .limit(per_page).offset((page - 1) * per_page).all()
+
+
+def venue_shows(venue_id, upcoming, now=None, page=1, per_page=SHOWS_PER_PAGE):
+  rows = _shows(Show.venue_id, venue_id, Artist, upcoming,
+                now or datetime.now(), page, per_page)
+  return [{
+    'artist_id': artist_id,
+    'artist_name': name,
+    'artist_image_link': image_link,
+    'start_time': date
+  } for date, artist_id, name, image_link in rows]
+
+
+def artist_shows(artist_id, upcoming, now=None, page=1, per_page=SHOWS_PER_PAGE):
+  rows = _shows(Show.artist_id, artist_id, Venue, upcoming,
+                now or datetime.now(), page, per_page)
+  return [{
+    'venue_id': venue_id,
+    'venue_name': name,
+    'venue_image_link': image_link,
+    'start_time': date
+  } for date, venue_id, name, image_link in rows]
+
+#----------------------------------------------------------------------------#
+# Deletes.
+#----------------------------------------------------------------------------#
+
+def bulk_delete(model, ids):
+  '''
+  delete venues or artists by id with a single DELETE statement; their shows
+  go with them through the ON DELETE CASCADE foreign keys, so nothing is
+  loaded into the session. the caller commits.
+  returns the number of deleted rows.
+  '''
+  return model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# maximum number of results a search page lists
+SEARCH_RESULTS_LIMIT = 50
+
+def search(model, term, limit=SEARCH_RESULTS_LIMIT):
+  '''
+  case-insensitive substring search on model.name (Venue or Artist).
+  on postgres the ILIKE is served by the pg_trgm GIN index and results are
+  ranked by trigram similarity; other backends (sqlite in tests) fall back
+  to a plain ILIKE ordered by name.
+  returns (total number of matches, first `limit` matches as dicts)
+  '''
+  query = model.query.filter(model.name.ilike('%' + term + '%'))
+  count = query.count()
+
+  if db.engine.dialect.name == 'postgresql':
+    query = query.order_by(db.func.similarity(model.name, term).desc(), model.name)
+  else:
+    query = query.order_by(model.name)
+
+  results = query.with_entities(model.id, model.name).limit(limit).all()
+  return count, [{'id': id, 'name': name} for id, name in results]
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import tempfile
+
+import pytest
+
+SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+
+'''
+test database
+    by default every pytest process (each pytest-xdist worker, or the
+    single process of a serial run) gets its own sqlite file, created from
+    the models and seeded once from the COPY data of trivia.psql.
+    test_flaskr.py reads its url from TRIVIA_TEST_DATABASE_URL.
+    pass --postgres, or set TRIVIA_TEST_DATABASE_URL yourself,
+    to run against a database prepared as the README describes.
+'''
+
+
+def read_snapshot(path=SNAPSHOT):
+    '''{table: [row dict]} from the COPY blocks of a pg_dump file'''
+    tables = {}
+    rows = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if rows is not None:
+                if line == '\\.':
+                    rows = None
+                    continue
+                values = [None if value == '\\N' else
+                          value.replace('\\t', '\t').replace('\\n', '\n')
+                          .replace('\\\\', '\\')
+                          for value in line.split('\t')]
+                rows.append(dict(zip(columns, values)))
+            elif line.startswith('COPY '):
+                # COPY public.<table> (<columns>) FROM stdin;
+                name, _, rest = line[len('COPY '):].partition(' ')
+                columns = [column.strip()
+                           for column in rest[1:rest.index(')')].split(',')]
+                rows = tables.setdefault(name.split('.')[-1], [])
+    return tables
+
+
+def seed_database(url, snapshot=SNAPSHOT):
+    from flaskr import create_app
+    from models import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url})
+    with app.app_context():
+        for table in db.metadata.sorted_tables:
+            rows = read_snapshot(snapshot).get(table.name)
+            if rows:
+                db.session.execute(table.insert(), rows)
+        db.session.commit()
+        db.session.remove()
+        db.get_engine(app).dispose()
+
+
+def is_xdist_controller(config):
+    '''the process that only hands tests out to the xdist workers'''
+    return (not hasattr(config, 'workerinput')
+            and getattr(config.option, 'dist', 'no') != 'no')
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('trivia')
+    group.addoption('--postgres', action='store_true',
+                    help='run against the trivia_test postgres database '
+                         'instead of a seeded sqlite file per worker.')
+    group.addoption('--timings', metavar='PATH',
+                    help='append the wall time of the run to PATH '
+                         '(one json object per line).')
+
+
+def pytest_configure(config):
+    config.trivia_started = time.perf_counter()
+    config.trivia_database = None
+
+    if (config.getoption('postgres')
+            or 'TRIVIA_TEST_DATABASE_URL' in os.environ
+            or is_xdist_controller(config)):
+        return
+
+    worker = os.environ.get('PYTEST_XDIST_WORKER', 'main')
+    fd, path = tempfile.mkstemp(
+        prefix='trivia_test_{}_'.format(worker), suffix='.db')
+    os.close(fd)
+    url = 'sqlite:///' + path
+    seed_database(url)
+
+    os.environ['TRIVIA_TEST_DATABASE_URL'] = url
+    config.trivia_database = path
+
+
+def pytest_unconfigure(config):
+    path = getattr(config, 'trivia_database', None)
+    if path:
+        del os.environ['TRIVIA_TEST_DATABASE_URL']
+        os.remove(path)
+
+
+'''
+wall time
+    printed after every run, and recorded with --timings so runs with
+    different worker counts or databases can be compared over time.
+'''
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if hasattr(config, 'workerinput'):
+        return
+
+    seconds = time.perf_counter() - config.trivia_started
+    workers = getattr(config.option, 'numprocesses', None) or 1
+    database = 'postgres' if config.getoption('postgres') else \
+        os.environ.get('TRIVIA_TEST_DATABASE_URL', 'sqlite').split(':')[0]
+    passed = len(terminalreporter.stats.get('passed', []))
+
+    terminalreporter.write_line(
+        'trivia suite: {} tests in {:.2f}s wall time, {} worker(s), {}'.format(
+            passed, seconds, workers, database))
+
+    path = config.getoption('timings')
+    if path:
+        with open(path, 'a') as f:
+            f.write(json.dumps({
+                'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'seconds': round(seconds, 3),
+                'workers': workers,
+                'database': database,
+                'passed': passed,
+                'exitstatus': int(exitstatus)
+            }) + '\n')
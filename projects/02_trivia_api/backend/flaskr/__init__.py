@@ -1,16 +1,34 @@
 import os
+import re
+import time
+import json
+import hashlib
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 import random
+import click
 
-from models import setup_db, Question, Category
+from models import setup_db, db, database_path, Question, Category
+from models import SEARCH_LANGUAGE, question_document, answer_document
+from .quiz_sessions import QuizSessions
+from .adaptive import QuestionBuckets, estimate_skill, difficulty_weights
+from .serialization import QUESTION_COLUMNS, format_rows, json_response
 
 QUESTIONS_PER_PAGE = 10
+# questions inserted per transaction by the bulk loaders
+BULK_CHUNK_SIZE = 1000
+# seconds a COUNT(*) of the questions table is reused
+COUNT_CACHE_TTL = 60
 
 
 def pages_pagination(request):
     page = request.args.get('page', 1, type=int)
+    # there is nothing before page 1, as with the old list slicing
+    if page < 1:
+        abort(404)
 
     start = (page - 1) * QUESTIONS_PER_PAGE
     end = start + QUESTIONS_PER_PAGE
@@ -18,26 +36,407 @@ def pages_pagination(request):
     return [start, end]
 
 
-def get_all_questions():
-    selection = Question.query.all()
-    questions = [question.format() for question in selection]
-    return questions
+def paginate_questions(request, query=None):
+    '''
+    one page of formatted questions, paged in SQL.
+    ?after=<question id> seeks past that question (keyset),
+    otherwise ?page=<n> is used as an offset.
+    '''
+    if query is None:
+        query = Question.query
+    query = query.order_by(Question.id)
+    after = request.args.get('after', type=int)
+
+    if after is not None:
+        query = query.filter(Question.id > after)
+    else:
+        start, end = pages_pagination(request)
+        query = query.offset(start)
+
+    rows = query.with_entities(*QUESTION_COLUMNS) \
+        .limit(QUESTIONS_PER_PAGE).all()
+    return format_rows(rows)
+
+
+def search_questions(request, search_string, include_answers=False):
+    '''
+    questions matching search_string, best matches first, paged in SQL.
+    on postgres every word of the search is matched as a word prefix
+    against the full text indexes of the question (and answer) texts,
+    other databases fall back to a substring match.
+    returns (page of formatted questions, total number of matches)
+    '''
+    words = re.findall(r'\w+', search_string)
+
+    if db.engine.dialect.name == 'postgresql':
+        if not words:
+            return [], 0
+        terms = db.func.to_tsquery(
+          SEARCH_LANGUAGE, ' & '.join(word + ':*' for word in words))
+        match = question_document().op('@@')(terms)
+        if include_answers:
+            match = match | answer_document().op('@@')(terms)
+        rank = db.func.ts_rank(question_document(), terms)
+    else:
+        pattern = '%' + search_string + '%'
+        match = Question.question.ilike(pattern)
+        if include_answers:
+            match = match | Question.answer.ilike(pattern)
+        rank = db.literal(0)
+
+    query = Question.query.filter(match)
+    total = query.count()
+
+    start, end = pages_pagination(request)
+    rows = query.with_entities(*QUESTION_COLUMNS) \
+        .order_by(rank.desc(), Question.id) \
+        .offset(start).limit(QUESTIONS_PER_PAGE).all()
+
+    return format_rows(rows), total
+
+
+'''
+cached question counts
+    keyed by category, None for all questions.
+    entries expire after COUNT_CACHE_TTL seconds
+    and are dropped whenever a question is written.
+'''
+question_counts = {}
+
+
+def count_questions(category_id=None):
+    '''number of questions, of one category if category_id is given'''
+    cached = question_counts.get(category_id)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
+    query = Question.query
+    if category_id is not None:
+        query = query.filter_by(category=str(category_id))
+
+    count = query.count()
+    question_counts[category_id] = (count, time.time() + COUNT_CACHE_TTL)
+    return count
+
+
+@event.listens_for(Question, 'after_insert')
+@event.listens_for(Question, 'after_update')
+@event.listens_for(Question, 'after_delete')
+def reset_question_counts(mapper, connection, target):
+    question_counts.clear()
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def reset_after_bulk_write(context):
+    # Query.update()/delete() run no mapper events,
+    # drop everything derived from the questions table
+    question_counts.clear()
+    context.session.info['reset_buckets'] = True
+
+
+def validate_question(record):
+    '''
+    the same rules as POST /questions: question, answer, difficulty and
+    category are required. returns (row for the questions table, error)
+    '''
+    if not isinstance(record, dict):
+        return None, 'expected a question object'
+
+    fields = ['question', 'answer', 'difficulty', 'category']
+    missing = [field for field in fields if record.get(field) is None]
+    if missing:
+        return None, 'missing ' + ', '.join(missing)
+
+    category = str(record['category'])
+    if not category.isdigit() or get_category_type(int(category)) is None:
+        return None, 'unknown category {}'.format(record['category'])
+
+    return {field: record[field] for field in fields}, None
+
+
+def read_ndjson(lines):
+    '''records of a newline delimited json stream, parse errors are kept'''
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError('invalid json: {}'.format(e))
+
+
+def insert_chunk(rows):
+    '''
+    insert rows with one executemany in one transaction, if the database
+    rejects the chunk insert row by row so only the bad rows fail.
+    returns [(position in rows, error)]
+    '''
+    table = Question.__table__
+    try:
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+        return []
+    except Exception:
+        db.session.rollback()
+
+    errors = []
+    for position, row in enumerate(rows):
+        try:
+            db.session.execute(table.insert(), [row])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            errors.append((position, str(getattr(e, 'orig', e)).strip()))
+    return errors
+
+
+def bulk_insert_questions(records, chunk_size=BULK_CHUNK_SIZE):
+    '''
+    validate and insert question records in chunked transactions.
+    returns (number inserted, [{'index': record index, 'message': error}])
+    '''
+    inserted = 0
+    errors = []
+    rows, indexes = [], []
+
+    def flush():
+        failures = insert_chunk(rows)
+        for position, message in failures:
+            errors.append({'index': indexes[position], 'message': message})
+        count = len(rows) - len(failures)
+        del rows[:], indexes[:]
+        return count
+
+    for index, record in enumerate(records):
+        if isinstance(record, ValueError):
+            errors.append({'index': index, 'message': str(record)})
+            continue
+
+        row, error = validate_question(record)
+        if error:
+            errors.append({'index': index, 'message': error})
+            continue
+
+        rows.append(row)
+        indexes.append(index)
+        if len(rows) == chunk_size:
+            inserted += flush()
+
+    if rows:
+        inserted += flush()
+
+    # core inserts skip the mapper events that reset the cached counts
+    # and maintain the quiz buckets
+    question_counts.clear()
+    question_buckets.reset()
+    return inserted, errors
+
+
+def quiz_category_id(body):
+    '''
+    id of the posted quiz_category as an int, 0 for all categories.
+    the frontend sends the ids as strings ("1"), the catalog uses ints.
+    '''
+    category = body.get('quiz_category') or {}
+    try:
+        return int(category.get('id', 0))
+    except (TypeError, ValueError):
+        abort(400)
+
+
+def filter_quiz_category(query, category_id):
+    '''restrict a question query to a quiz category, 0 means all categories'''
+    if category_id != 0:
+        if get_category_type(category_id) is None:
+            abort(404)
+        query = query.filter_by(category=str(category_id))
+    return query
+
+
+def next_session_question(quiz_sessions, token):
+    '''
+    next question of a server side quiz session, None when it is over.
+    questions deleted since the deck was dealt are skipped.
+    '''
+    while True:
+        question_id = quiz_sessions.next(token)
+        if question_id is None:
+            return None
+        question = Question.query.get(question_id)
+        if question is not None:
+            return question
+
+
+def random_question(category_id, previous_questions):
+    '''
+    a random question of the category (0 for all categories) that is not
+    one of previous_questions, or None once every question was asked.
+    the previous ids are excluded in SQL and one row is picked by a random
+    offset into the remaining ones, so no question list is loaded.
+    '''
+    query = filter_quiz_category(Question.query, category_id)
+
+    if previous_questions:
+        query = query.filter(~Question.id.in_(previous_questions))
+
+    remaining = query.count()
+    if remaining == 0:
+        return None
+
+    return query.order_by(Question.id) \
+        .offset(random.randrange(remaining)).limit(1).first()
+
+
+'''
+adaptive quiz buckets
+    question ids by (category, difficulty), loaded on the first adaptive
+    quiz. the question writes of a flush are collected and applied once
+    they are committed, a rollback discards them.
+'''
+question_buckets = QuestionBuckets()
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_bucket_changes(session, flush_context):
+    changes = session.info.setdefault('bucket_changes', [])
+    for instance in list(session.new) + list(session.dirty):
+        if isinstance(instance, Question):
+            changes.append((instance.id, instance.category,
+                            instance.difficulty, False))
+    for instance in session.deleted:
+        if isinstance(instance, Question):
+            changes.append((instance.id, None, None, True))
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_bucket_changes(session):
+    changes = session.info.pop('bucket_changes', [])
+    if session.info.pop('reset_buckets', False):
+        question_buckets.reset()
+        return
+    for id, category, difficulty, deleted in changes:
+        if deleted:
+            question_buckets.remove(id)
+        else:
+            question_buckets.add(id, category, difficulty)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_bucket_changes(session, previous_transaction):
+    session.info.pop('bucket_changes', None)
+    session.info.pop('reset_buckets', None)
+
+
+def load_question_buckets():
+    if not question_buckets.loaded:
+        question_buckets.load(Question.query.with_entities(
+          Question.id, Question.category, Question.difficulty).all())
+    return question_buckets
+
+
+def adaptive_question(category_id, previous_questions, answers):
+    '''
+    a question of the category (0 for all categories) that is not one of
+    previous_questions, its difficulty drawn around the skill the answers
+    ([{'id': question id, 'correct': bool}]) show.
+    returns (question or None once every question was asked, skill)
+    '''
+    if category_id != 0 and get_category_type(category_id) is None:
+        abort(404)
+    buckets = load_question_buckets()
+
+    answered = [(buckets.difficulty(answer.get('id')),
+                 bool(answer.get('correct'))) for answer in answers]
+    skill = estimate_skill(
+      [(difficulty, correct) for difficulty, correct in answered
+       if difficulty is not None])
+    weights = difficulty_weights(skill)
+    exclude = set(previous_questions)
+
+    while True:
+        question_id = buckets.sample(category_id, weights, exclude)
+        if question_id is None:
+            return None, skill
+        question = Question.query.get(question_id)
+        if question is not None:
+            return question, skill
+        # written by a transaction that was rolled back
+        buckets.remove(question_id)
+
+
+'''
+category catalog
+    process local copy of the categories table as {id: type} with its ETag.
+    a committed write to a Category bumps category_version and the next
+    read reloads the table, as does a read CATEGORY_CATALOG_TTL seconds
+    after the last load (writes of other processes). every other read is
+    served without a query.
+'''
+CATEGORY_CATALOG_TTL = 60
+category_version = [0]
+category_catalog = {
+  'version': None, 'loaded_at': None, 'categories': {}, 'etag': None}
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_category_writes(session, flush_context):
+    # bumping at flush would let a read before the commit load the old
+    # table under the new version, so only remember the write here
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    if any(isinstance(instance, Category) for instance in changed):
+        session.info['categories_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_soft_rollback')
+def bump_category_version(session, *args):
+    # a rolled back write bumps too: this session may have read the
+    # flushed but never committed rows into the catalog
+    if session.info.pop('categories_changed', False):
+        category_version[0] += 1
+
+
+def load_category_catalog():
+    if (category_catalog['version'] != category_version[0]
+            or time.time() - category_catalog['loaded_at']
+            > CATEGORY_CATALOG_TTL):
+        version = category_version[0]
+        categories = {}
+
+        for category in Category.query.order_by(Category.id).all():
+            categories[category.id] = category.type
+
+        # a content hash, so every process hands out the same ETag
+        digest = hashlib.sha1(
+            json.dumps(sorted(categories.items())).encode()).hexdigest()
+        category_catalog.update({
+          'version': version,
+          'loaded_at': time.time(),
+          'categories': categories,
+          'etag': digest
+        })
+
+    return category_catalog
 
 
 def get_all_categories():
-    selection = Category.query.all()
-    categories = {}
+    return load_category_catalog()['categories']
 
-    for category in selection:
-        categories[category.id] = category.type
 
-    return categories
+def get_category_type(category_id):
+    '''type of the category, None if there is no such category'''
+    return get_all_categories().get(category_id)
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+    setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
+    quiz_sessions = QuizSessions()
 
     '''
     Set up CORS. Allow '*' for origins.
@@ -69,16 +468,23 @@ def create_app(test_config=None):
     @app.route('/categories', methods=['GET'])
     def get_categories():
 
-        categories = get_all_categories()
+        catalog = load_category_catalog()
+        categories = catalog['categories']
 
         if len(categories) == 0:
             abort(404)
 
-        return jsonify({
-          'success': True,
-          'categories': categories,
-          'num_of_categories': len(categories)
-        })
+        if catalog['etag'] in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            response = jsonify({
+              'success': True,
+              'categories': categories,
+              'num_of_categories': len(categories)
+            })
+
+        response.set_etag(catalog['etag'])
+        return response
 
     '''
     GET endpoint to handle GET requests for questions,
@@ -89,19 +495,19 @@ def create_app(test_config=None):
     @app.route('/questions', methods=['GET'])
     def get_questions():
 
-        questions = get_all_questions()
+        questions = paginate_questions(request)
 
         if len(questions) == 0:
             abort(404)
 
-        start, end = pages_pagination(request)
-
         categories = get_all_categories()
 
-        return jsonify({
+        return json_response({
           'success': True,
-          'questions': questions[start:end],
-          'total_questions': len(questions),
+          'questions': questions,
+          'total_questions': count_questions(),
+          'next_cursor': (questions[-1]['id']
+                          if len(questions) == QUESTIONS_PER_PAGE else None),
           'categories': categories,
           'currentCategory': None
         })
@@ -178,49 +584,89 @@ def create_app(test_config=None):
             POST endpoint to get questions based on a search term.
             It should return any questions for whom the search term
             is a substring of the question.
+            Set searchAnswers to also search the answers.
             '''
             search_string = body.get('searchTerm')
 
-            result = Question.query.filter(
-              Question.question.ilike('%' + search_string + '%')
-              ).all()
-
-            questions = [r.format() for r in result]
+            questions, total = search_questions(
+              request, search_string, bool(body.get('searchAnswers')))
 
             if len(questions) == 0:
                 abort(404)
 
-            start, end = pages_pagination(request)
-            return jsonify({
+            return json_response({
               'success': True,
               'searchTerm': search_string,
-              'questions': questions[start: end]
+              'questions': questions,
+              'total_questions': total
             })
 
+    '''
+    POST endpoint to insert many questions at once.
+    takes a json array of questions, or newline delimited json
+    (Content-Type: application/x-ndjson) with one question per line,
+    validated like POST /questions and inserted in chunks.
+    returns the number inserted and the errors of the rejected questions.
+    '''
+    @app.route('/questions/bulk', methods=['POST'])
+    def insert_questions_bulk():
+        if request.mimetype == 'application/x-ndjson':
+            records = read_ndjson(request.stream)
+        else:
+            records = request.get_json(silent=True)
+            if not isinstance(records, list):
+                abort(400)
+
+        inserted, errors = bulk_insert_questions(records)
+
+        return jsonify({
+          'success': True,
+          'inserted': inserted,
+          'errors': errors
+        })
+
+    '''
+    flask load-questions PATH
+        bulk insert questions from a json array or ndjson file
+    '''
+    @app.cli.command('load-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--chunk-size', default=BULK_CHUNK_SIZE, show_default=True)
+    def load_questions(path, chunk_size):
+        with open(path) as f:
+            is_array = f.read(1024).lstrip().startswith('[')
+            f.seek(0)
+            records = json.load(f) if is_array else read_ndjson(f)
+
+            inserted, errors = bulk_insert_questions(records, chunk_size)
+
+        for error in errors:
+            click.echo('question {index}: {message}'.format(**error), err=True)
+        click.echo('{} questions inserted, {} rejected'.format(
+          inserted, len(errors)))
+
     '''
     GET endpoint to get questions based on category.
     '''
     @app.route('/categories/<int:id>/questions', methods=['GET'])
     def get_category(id):
-        category = Category.query.get(id)
+        category_type = get_category_type(id)
 
-        if category is None:
+        if category_type is None:
             abort(404)
 
-        selection = Question.query.filter_by(category=category.id).all()
-        all_questions = Question.query.all()
-
-        questions = [q.format() for q in selection]
+        questions = paginate_questions(
+          request, Question.query.filter_by(category=str(id)))
 
         if len(questions) == 0:
             abort(404)
 
-        start, end = pages_pagination(request)
-        return jsonify({
+        return json_response({
           'success': True,
-          'currentCategory': category.type,
-          'questions': questions[start: end],
-          'total_questions': len(all_questions)
+          'currentCategory': category_type,
+          'questions': questions,
+          'total_questions': count_questions(),
+          'category_total_questions': count_questions(id)
         })
 
     '''
@@ -228,45 +674,83 @@ def create_app(test_config=None):
     This endpoint should take category and previous question parameters
     and return a random questions within the given category,
     if provided, and that is not one of the previous questions.
+
+    Adaptive quizzes: posting {"adaptive": true, "answers": [{"id": ...,
+    "correct": true}, ...]} along with previous_questions draws the next
+    question's difficulty around the skill shown by the answers so far.
+
+    Server side sessions: posting {"session": true, "quiz_category": ...}
+    shuffles the category once and returns a "quiz_session" token,
+    posting {"quiz_session": token} afterwards returns the next question
+    without sending previous_questions.
     '''
     @app.route('/quizzes', methods=['POST'])
     def get_quiz_question():
         body = request.get_json()
 
-        previous_questions = body.get('previous_questions')
-        category = body.get('quiz_category')
-        category_id = category.get('id')
-
-        if category_id == 0:
-            questions = Question.query.all()
+        token = body.get('quiz_session')
+        if token is None and body.get('session'):
+            category_id = quiz_category_id(body)
+            ids = filter_quiz_category(
+              Question.query.with_entities(Question.id), category_id
+            ).all()
+            token = quiz_sessions.start([id for id, in ids])
 
-        else:
-            category = Category.query.get(category_id)
-            if category is None:
+        if token is not None:
+            try:
+                question = next_session_question(quiz_sessions, token)
+            except KeyError:
                 abort(404)
 
-            questions = Question.query.filter_by(
-              category=category_id
-            ).all()
+            if question is None:
+                return jsonify({
+                  'success': True,
+                  'finished': True,
+                  'quiz_session': token,
+                  'message': 'you finished all questions in this category'
+                })
 
-        if len(previous_questions) == len(questions):
             return jsonify({
               'success': True,
-              'message': 'you finished all questions in this category'
+              'finished': False,
+              'quiz_session': token,
+              'question': question.format()
             })
 
-        question = questions[random.randint(0, len(questions)-1)]
-        in_previous = True
+        previous_questions = body.get('previous_questions') or []
+        category_id = quiz_category_id(body)
+
+        if body.get('adaptive'):
+            question, skill = adaptive_question(
+              category_id, previous_questions, body.get('answers') or [])
+
+            if question is None:
+                return jsonify({
+                  'success': True,
+                  'finished': True,
+                  'skill': skill,
+                  'message': 'you finished all questions in this category'
+                })
+
+            return jsonify({
+              'success': True,
+              'finished': False,
+              'skill': skill,
+              'question': question.format()
+            })
 
-        while in_previous:
-            if question.id in previous_questions:
-                question = questions[random.randint(0, len(questions)-1)]
+        question = random_question(category_id, previous_questions)
 
-            else:
-                in_previous = False
+        if question is None:
+            return jsonify({
+              'success': True,
+              'finished': True,
+              'message': 'you finished all questions in this category'
+            })
 
         return jsonify({
           'success': True,
+          'finished': False,
           'question': question.format()
         })
 
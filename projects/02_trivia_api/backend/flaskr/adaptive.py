@@ -0,0 +1,146 @@
+import random
+from threading import Lock
+
+DIFFICULTIES = (1, 2, 3, 4, 5)
+# skill of a player without any answers, the middle difficulty
+START_SKILL = 3.0
+# how far one answer moves the skill towards its target
+SKILL_RATE = 0.5
+# random picks tried before the remaining ids of the buckets are listed
+MAX_REJECTIONS = 16
+
+
+'''
+QuestionBuckets
+    question ids grouped by (category, difficulty).
+    every bucket is a list plus an {id: position} index, so adding,
+    removing (swap with the last id and pop) and drawing a random id
+    are all O(1).
+'''
+
+
+class QuestionBuckets:
+    def __init__(self):
+        self.buckets = {}
+        self.positions = {}
+        self.keys = {}
+        self.loaded = False
+        self.lock = Lock()
+
+    def load(self, rows):
+        '''replace the buckets with (id, category, difficulty) rows'''
+        with self.lock:
+            self.buckets, self.positions, self.keys = {}, {}, {}
+            for id, category, difficulty in rows:
+                self._add(id, category, difficulty)
+            self.loaded = True
+
+    def reset(self):
+        '''forget every bucket, the next load() rebuilds them'''
+        with self.lock:
+            self.loaded = False
+            self.buckets, self.positions, self.keys = {}, {}, {}
+
+    def _add(self, id, category, difficulty):
+        try:
+            key = (int(category), int(difficulty))
+        except (TypeError, ValueError):
+            # a question without a numeric category and difficulty
+            # can't be placed, the adaptive quiz leaves it out
+            return
+        bucket = self.buckets.setdefault(key, [])
+        self.positions[id] = len(bucket)
+        self.keys[id] = key
+        bucket.append(id)
+
+    def _remove(self, id):
+        key = self.keys.pop(id, None)
+        if key is None:
+            return
+        bucket = self.buckets[key]
+        position = self.positions.pop(id)
+        last = bucket.pop()
+        if last != id:
+            bucket[position] = last
+            self.positions[last] = position
+        if not bucket:
+            del self.buckets[key]
+
+    def add(self, id, category, difficulty):
+        with self.lock:
+            if self.loaded:
+                self._remove(id)
+                self._add(id, category, difficulty)
+
+    def remove(self, id):
+        with self.lock:
+            if self.loaded:
+                self._remove(id)
+
+    def difficulty(self, id):
+        '''difficulty of a question id, None if it is not in a bucket'''
+        key = self.keys.get(id)
+        return key[1] if key else None
+
+    def sample(self, category_id, weights, exclude=()):
+        '''
+        a random question id of the category (0 for all categories),
+        not in exclude. a difficulty is drawn by `weights` first, then an
+        id of that bucket. returns None once every id was excluded.
+        '''
+        with self.lock:
+            keys = [key for key in self.buckets
+                    if category_id == 0 or key[0] == category_id]
+            # per difficulty the weight is shared by its buckets
+            # in proportion to their sizes
+            totals = {}
+            for key in keys:
+                totals[key[1]] = totals.get(key[1], 0) + len(self.buckets[key])
+            key_weights = [
+                weights.get(key[1], 0) * len(self.buckets[key]) / totals[key[1]]
+                for key in keys]
+
+            if not keys or not any(key_weights):
+                return None
+
+            for _ in range(MAX_REJECTIONS):
+                key = random.choices(keys, key_weights)[0]
+                id = random.choice(self.buckets[key])
+                if id not in exclude:
+                    return id
+
+            # most of the questions were asked already, draw from what is left
+            remaining = [(key, [id for id in self.buckets[key]
+                                if id not in exclude])
+                         for key in keys]
+            remaining = [(key, ids) for key, ids in remaining if ids]
+            if not remaining:
+                return None
+            key, ids = random.choices(
+                remaining, [weights.get(key[1], 0) or 1e-9
+                            for key, ids in remaining])[0]
+            return random.choice(ids)
+
+
+'''
+player skill
+    estimated from the difficulties of the answered questions: a correct
+    answer pulls the skill towards one above that difficulty, a wrong one
+    towards one below. the next difficulty is drawn with weights that fall
+    off with the distance to the skill, so the quiz follows the player
+    without ever ruling a difficulty out.
+'''
+
+
+def estimate_skill(answers):
+    '''skill in [1, 5] from [(difficulty, correct)] in answer order'''
+    skill = START_SKILL
+    for difficulty, correct in answers:
+        target = difficulty + 1 if correct else difficulty - 1
+        skill += SKILL_RATE * (target - skill)
+    return min(max(skill, DIFFICULTIES[0]), DIFFICULTIES[-1])
+
+
+def difficulty_weights(skill):
+    return {difficulty: 1 / (1 + abs(difficulty - skill)) ** 2
+            for difficulty in DIFFICULTIES}
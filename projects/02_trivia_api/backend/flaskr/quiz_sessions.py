@@ -0,0 +1,64 @@
+import random
+import secrets
+from array import array
+from collections import OrderedDict
+from threading import Lock
+
+# number of quiz sessions kept before the least recently used is dropped
+MAX_QUIZ_SESSIONS = 10000
+
+
+'''
+LocalDeckStore
+    in-process stand-in for a shared store (e.g. a redis list per session:
+    RPUSH to save a deck, LPOP to deal from it).
+    decks are compact array('i') of question ids,
+    the least recently used session is evicted once max_sessions is reached.
+'''
+
+
+class LocalDeckStore:
+    def __init__(self, max_sessions=MAX_QUIZ_SESSIONS):
+        self.max_sessions = max_sessions
+        self.decks = OrderedDict()
+        self.lock = Lock()
+
+    def save(self, key, deck):
+        with self.lock:
+            self.decks[key] = deck
+            self.decks.move_to_end(key)
+            while len(self.decks) > self.max_sessions:
+                self.decks.popitem(last=False)
+
+    def pop(self, key):
+        '''
+        next question id of the deck, None once it is empty.
+        raises KeyError for an unknown or evicted session
+        '''
+        with self.lock:
+            deck = self.decks[key]
+            self.decks.move_to_end(key)
+            return deck.pop() if deck else None
+
+
+'''
+QuizSessions
+    server side quiz games: the category's question ids are shuffled
+    once when the game starts, every question after that is an O(1) pop
+'''
+
+
+class QuizSessions:
+    def __init__(self, store=None):
+        self.store = store or LocalDeckStore()
+
+    def start(self, question_ids):
+        deck = array('i', question_ids)
+        random.shuffle(deck)
+        token = secrets.token_urlsafe(16)
+        self.store.save(token, deck)
+        return token
+
+    def next(self, token):
+        '''next question id, None when the game is over'''
+        return self.store.pop(token)
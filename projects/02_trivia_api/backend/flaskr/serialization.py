@@ -0,0 +1,85 @@
+import json
+from flask import current_app
+
+from models import Question
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+'''
+row serialization
+    list endpoints select plain column tuples instead of Question objects,
+    format_rows() turns them into the same dicts as Question.format()
+'''
+
+QUESTION_COLUMNS = (
+    Question.id,
+    Question.question,
+    Question.answer,
+    Question.category,
+    Question.difficulty
+)
+QUESTION_FIELDS = tuple(column.key for column in QUESTION_COLUMNS)
+
+
+def format_rows(rows, fields=QUESTION_FIELDS):
+    return [dict(zip(fields, row)) for row in rows]
+
+
+'''
+json encoding
+    orjson when it is installed, the standard library otherwise
+'''
+
+
+if orjson is not None:
+    def dumps(payload):
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(payload):
+        return json.dumps(payload, separators=(',', ':'))
+
+
+def json_response(payload, status=200):
+    '''a drop in for jsonify(payload) using the fastest available encoder'''
+    return current_app.response_class(
+        dumps(payload), status=status, mimetype='application/json')
+
+
+'''
+benchmark
+    per request CPU of building and encoding a page of questions,
+    Question objects + format() + jsonify vs column tuples + json_response.
+    run with: python -m flaskr.serialization
+'''
+
+
+def benchmark(page_sizes=(10, 100, 1000), repeat=200):
+    import timeit
+    from flask import Flask, jsonify
+
+    app = Flask(__name__)
+    for size in page_sizes:
+        rows = [(i, 'Question number {}?'.format(i), 'Answer {}'.format(i),
+                 i % 6 + 1, i % 5 + 1) for i in range(size)]
+        objects = [Question(*row[1:]) for row in rows]
+
+        def orm_jsonify():
+            jsonify({'questions': [q.format() for q in objects]})
+
+        def rows_json_response():
+            json_response({'questions': format_rows(rows)})
+
+        with app.app_context():
+            for name, run in [('objects + jsonify', orm_jsonify),
+                              ('rows + json_response', rows_json_response)]:
+                best = min(timeit.repeat(run, number=1, repeat=repeat))
+                print('{:>5} questions  {:<22}{:>10.1f} us/request'.format(
+                    size, name, best * 1e6))
+
+
+if __name__ == '__main__':
+    benchmark()
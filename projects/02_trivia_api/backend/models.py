@@ -28,6 +28,38 @@ def setup_db(app, database_path=database_path):
     db.app = app
     db.init_app(app)
     db.create_all()
+    setup_search_index()
+
+
+'''
+setup_search_index()
+    full text search indexes over the question and answer texts (postgres).
+    the indexed expressions must match question_document()/answer_document()
+    for the planner to use them.
+'''
+
+SEARCH_LANGUAGE = 'english'
+
+
+def question_document():
+    return db.func.to_tsvector(SEARCH_LANGUAGE, Question.question)
+
+
+def answer_document():
+    return db.func.to_tsvector(SEARCH_LANGUAGE, Question.answer)
+
+
+def setup_search_index():
+    if db.engine.dialect.name != 'postgresql':
+        return
+
+    for name, column in [('ix_questions_question_fts', 'question'),
+                         ('ix_questions_answer_fts', 'answer')]:
+        db.session.execute(
+            "CREATE INDEX IF NOT EXISTS {} ON questions "
+            "USING GIN (to_tsvector('{}', {}))".format(
+                name, SEARCH_LANGUAGE, column))
+    db.session.commit()
 
 
 '''
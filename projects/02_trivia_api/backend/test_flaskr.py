@@ -4,7 +4,7 @@ import json
 from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -12,15 +12,17 @@ class TriviaTestCase(unittest.TestCase):
 
     def setUp(self):
         """Define test variables and initialize app."""
-        self.app = create_app()
-        self.client = self.app.test_client
         self.database_name = "trivia_test"
-        self.database_path = "postgresql://{}:{}@{}/{}".format(
-            'postgres',
-            'root',
-            'localhost:5432',
-            self.database_name)
-        setup_db(self.app, self.database_path)
+        # conftest.py points this at a seeded sqlite database per worker
+        self.database_path = os.environ.get(
+            'TRIVIA_TEST_DATABASE_URL',
+            "postgresql://{}:{}@{}/{}".format(
+                'postgres',
+                'root',
+                'localhost:5432',
+                self.database_name))
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_path})
+        self.client = self.app.test_client
 
         # binds the app to the current context
         with self.app.app_context():
@@ -46,6 +48,74 @@ class TriviaTestCase(unittest.TestCase):
         """Executed after reach test"""
         pass
 
+    '''
+    TEST: categories are served from the catalog cache,
+    with an ETag for conditional requests.
+    '''
+    # ------------success------------
+    def test_get_categories_success(self):
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(
+            data['num_of_categories'], Category.query.count())
+        self.assertTrue(res.headers.get('ETag'))
+
+    def test_get_categories_not_modified(self):
+        etag = self.client().get('/categories').headers['ETag']
+        res = self.client().get(
+            '/categories', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+    def test_categories_reload_after_write(self):
+        before = self.client().get('/categories')
+
+        category = Category('Testing')
+        db.session.add(category)
+        db.session.commit()
+        after = self.client().get(
+            '/categories',
+            headers={'If-None-Match': before.headers['ETag']})
+        data = json.loads(after.data)
+        db.session.delete(category)
+        db.session.commit()
+
+        self.assertEqual(after.status_code, 200)
+        self.assertIn('Testing', data['categories'].values())
+
+    def test_categories_reload_after_commit_only(self):
+        from flaskr import category_version, get_all_categories
+
+        get_all_categories()
+        version = category_version[0]
+        category = Category('Racy')
+        db.session.add(category)
+        db.session.flush()
+
+        # flushed is not committed, other sessions still see the old table
+        self.assertEqual(category_version[0], version)
+        db.session.commit()
+        self.assertEqual(category_version[0], version + 1)
+        self.assertIn('Racy', get_all_categories().values())
+
+        db.session.delete(category)
+        db.session.commit()
+        self.assertNotIn('Racy', get_all_categories().values())
+
+    def test_categories_forget_rolled_back_writes(self):
+        from flaskr import get_all_categories
+
+        db.session.add(Category('Rolled back'))
+        db.session.flush()
+        get_all_categories()
+        db.session.rollback()
+
+        self.assertNotIn('Rolled back', get_all_categories().values())
+
     '''
     TEST: At this point, when you start the application
     you should see questions and categories generated,
@@ -62,6 +132,40 @@ class TriviaTestCase(unittest.TestCase):
 
         self.assertTrue(data['total_questions'])
 
+    def test_get_questions_pages_success(self):
+        first = json.loads(self.client().get('/questions?page=1').data)
+        second = json.loads(self.client().get('/questions?page=2').data)
+
+        first_ids = [q['id'] for q in first['questions']]
+        second_ids = [q['id'] for q in second['questions']]
+
+        self.assertEqual(len(first_ids), 10)
+        self.assertTrue(second_ids)
+        self.assertFalse(set(first_ids) & set(second_ids))
+        self.assertEqual(first['total_questions'], second['total_questions'])
+
+    def test_get_questions_after_cursor_success(self):
+        first = json.loads(self.client().get('/questions').data)
+        res = self.client().get(
+            '/questions?after={}'.format(first['next_cursor']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['questions'])
+        self.assertTrue(all(
+            q['id'] > first['next_cursor'] for q in data['questions']))
+
+    def test_total_questions_follows_inserts(self):
+        before = json.loads(self.client().get('/questions').data)
+
+        question = Question('count me?', 'yes', 1, 1)
+        question.insert()
+        after = json.loads(self.client().get('/questions').data)
+        question.delete()
+
+        self.assertEqual(
+            after['total_questions'], before['total_questions'] + 1)
+
     # ------------fail------------
     def test_get_all_questions_fail(self):
         '''using wrong endpoint [/question]'''
@@ -72,6 +176,21 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], "resource not found")
 
+    def test_get_questions_page_out_of_range_fail(self):
+        res = self.client().get('/questions?page=1000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_get_questions_page_below_one_fail(self):
+        for page in (0, -1):
+            res = self.client().get('/questions?page={}'.format(page))
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 404)
+            self.assertEqual(data['success'], False)
+
     '''
     TEST: When you click the trash icon next to a question,
     -------------the question will be removed-------------
@@ -136,6 +255,58 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'bad request')
 
+    '''
+    TEST: many questions can be inserted at once,
+    invalid ones are reported without stopping the others.
+    '''
+    # ------------success------------
+    def test_bulk_insert_questions_success(self):
+        before = json.loads(self.client().get('/questions').data)
+        res = self.client().post('/questions/bulk', json=[
+            dict(self.new_question, question='bulk test question 1?'),
+            dict(self.new_question, question='bulk test question 2?'),
+            self.failed_question,
+            dict(self.new_question, category=1000)
+        ])
+        data = json.loads(res.data)
+        after = json.loads(self.client().get('/questions').data)
+        Question.query.filter(
+            Question.question.like('bulk test%')).delete('fetch')
+        db.session.commit()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 2)
+        self.assertEqual([e['index'] for e in data['errors']], [2, 3])
+        self.assertEqual(
+            after['total_questions'], before['total_questions'] + 2)
+
+    def test_bulk_insert_questions_ndjson_success(self):
+        lines = [
+            json.dumps(dict(self.new_question, question='bulk test ndjson?')),
+            '{not json',
+            ''
+        ]
+        res = self.client().post(
+            '/questions/bulk',
+            data='\n'.join(lines),
+            content_type='application/x-ndjson')
+        data = json.loads(res.data)
+        Question.query.filter(
+            Question.question.like('bulk test%')).delete('fetch')
+        db.session.commit()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['errors'][0]['index'], 1)
+
+    # ------------fail------------
+    def test_bulk_insert_questions_fail(self):
+        res = self.client().post('/questions/bulk', json={'question': 'x'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
     '''
     TEST: Search by any phrase.
     The questions list will update to include only question
@@ -154,6 +325,35 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertEqual(data['searchTerm'], 'Taj Mahal')
         self.assertTrue(data['questions'])
+        self.assertEqual(data['total_questions'], len(data['questions']))
+
+    def test_search_question_prefix_success(self):
+        res = self.client().post('/questions', json={
+            'searchTerm': 'taj mah'
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Taj Mahal', data['questions'][0]['question'])
+
+    def test_search_answers_success(self):
+        question = Question(
+            'Which test answer is this?', 'Zanzibarian answer', 1, 1)
+        question.insert()
+
+        only_questions = self.client().post('/questions', json={
+            'searchTerm': 'Zanzibarian'
+        })
+        with_answers = self.client().post('/questions', json={
+            'searchTerm': 'Zanzibarian',
+            'searchAnswers': True
+        })
+        data = json.loads(with_answers.data)
+        question.delete()
+
+        self.assertEqual(only_questions.status_code, 404)
+        self.assertEqual(with_answers.status_code, 200)
+        self.assertEqual(data['questions'][0]['answer'], 'Zanzibarian answer')
 
     # ------------fail------------
     def test_search_question_fail(self):
@@ -184,6 +384,19 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['currentCategory'], category.type)
         self.assertTrue(data['questions'])
         self.assertTrue(data['total_questions'])
+        self.assertEqual(
+            data['category_total_questions'],
+            Question.query.filter_by(category=str(id)).count())
+        self.assertTrue(all(
+            str(q['category']) == str(id) for q in data['questions']))
+
+    # ------------fail------------
+    def test_get_questions_by_category_page_out_of_range_fail(self):
+        res = self.client().get('/categories/2/questions?page=1000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
 
     # ------------fail------------
     def test_get_questions_by_category_fail(self):
@@ -231,6 +444,205 @@ class TriviaTestCase(unittest.TestCase):
             data['message'],
             'you finished all questions in this category'
             )
+        self.assertTrue(data['finished'])
+
+    def test_quiz_never_repeats_questions(self):
+        previous_questions = []
+        while True:
+            res = self.client().post('/quizzes', json={
+                'previous_questions': previous_questions,
+                'quiz_category': {
+                    'id': 1,
+                    'type': 'Science'
+                }})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            if data['finished']:
+                break
+            self.assertNotIn(data['question']['id'], previous_questions)
+            self.assertEqual(str(data['question']['category']), '1')
+            previous_questions.append(data['question']['id'])
+
+        self.assertEqual(
+            len(previous_questions),
+            Question.query.filter_by(category='1').count())
+
+    def test_quiz_session_deals_whole_category(self):
+        res = self.client().post('/quizzes', json={
+            'session': True,
+            'quiz_category': {
+                'id': 1,
+                'type': 'Science'
+            }})
+        data = json.loads(res.data)
+        token = data['quiz_session']
+        seen = []
+
+        while not data['finished']:
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(data['quiz_session'], token)
+            seen.append(data['question']['id'])
+            res = self.client().post('/quizzes', json={'quiz_session': token})
+            data = json.loads(res.data)
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(
+            len(seen), Question.query.filter_by(category='1').count())
+
+    def test_adaptive_quiz_never_repeats_questions(self):
+        previous_questions = []
+        answers = []
+        while True:
+            res = self.client().post('/quizzes', json={
+                'adaptive': True,
+                'previous_questions': previous_questions,
+                'answers': answers,
+                'quiz_category': {
+                    'id': 1,
+                    'type': 'Science'
+                }})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertTrue(1 <= data['skill'] <= 5)
+            if data['finished']:
+                break
+            self.assertNotIn(data['question']['id'], previous_questions)
+            self.assertEqual(str(data['question']['category']), '1')
+            previous_questions.append(data['question']['id'])
+            answers.append({'id': data['question']['id'], 'correct': True})
+
+        self.assertEqual(
+            len(previous_questions),
+            Question.query.filter_by(category='1').count())
+
+    def test_adaptive_quiz_skill_follows_answers(self):
+        questions = Question.query.all()
+
+        def skill(correct):
+            res = self.client().post('/quizzes', json={
+                'adaptive': True,
+                'answers': [{'id': q.id, 'correct': correct}
+                            for q in questions],
+                'quiz_category': {'id': 0}})
+            return json.loads(res.data)['skill']
+
+        self.assertGreater(skill(True), skill(False))
+
+    def test_adaptive_quiz_sees_new_questions(self):
+        question = Question('adaptive question?', 'yes', '1', 5)
+        question.insert()
+        try:
+            res = self.client().post('/quizzes', json={
+                'adaptive': True,
+                'previous_questions': [
+                    q.id for q in Question.query.filter_by(category='1')
+                    if q.id != question.id],
+                'quiz_category': {'id': 1}})
+            data = json.loads(res.data)
+
+            self.assertEqual(data['question']['id'], question.id)
+        finally:
+            question.delete()
+
+    def test_quiz_category_id_as_string_success(self):
+        '''the frontend sends the category ids as strings'''
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [],
+            'quiz_category': {
+                'id': '1',
+                'type': 'Science'
+            }})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(str(data['question']['category']), '1')
+
+        res = self.client().post('/quizzes', json={
+            'session': True,
+            'quiz_category': {
+                'id': '1',
+                'type': 'Science'
+            }})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(str(data['question']['category']), '1')
+
+    def test_adaptive_quiz_category_id_as_string_success(self):
+        res = self.client().post('/quizzes', json={
+            'adaptive': True,
+            'quiz_category': {'id': '1', 'type': 'Science'}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(str(data['question']['category']), '1')
+
+    def test_adaptive_quiz_skips_unbucketable_questions(self):
+        # load the buckets, so the insert below goes through the listener
+        self.client().post('/quizzes', json={
+            'adaptive': True, 'quiz_category': {'id': 0}})
+
+        question = Question('no difficulty?', 'none', '1', None)
+        question.insert()
+        try:
+            res = self.client().post('/quizzes', json={
+                'adaptive': True,
+                'previous_questions': [
+                    q.id for q in Question.query.filter_by(category='1')
+                    if q.id != question.id],
+                'quiz_category': {'id': 1}})
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertTrue(data['finished'])
+        finally:
+            question.delete()
+
+    def test_adaptive_quiz_keeps_rolled_back_deletes(self):
+        # load the buckets, so the delete below reaches them
+        self.client().post('/quizzes', json={
+            'adaptive': True, 'quiz_category': {'id': 0}})
+
+        question = Question.query.filter_by(category='1').first()
+        db.session.delete(question)
+        db.session.flush()
+        db.session.rollback()
+
+        res = self.client().post('/quizzes', json={
+            'adaptive': True,
+            'previous_questions': [
+                q.id for q in Question.query.filter_by(category='1')
+                if q.id != question.id],
+            'quiz_category': {'id': 1}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], question.id)
+
+    # ------------fail------------
+    def test_quiz_category_id_invalid_fail(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [],
+            'quiz_category': {
+                'id': 'science',
+                'type': 'Science'
+            }})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    # ------------fail------------
+    def test_quiz_session_unknown_fail(self):
+        res = self.client().post('/quizzes', json={
+            'quiz_session': 'notASession'
+            })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
 
     # ------------fail------------
     def test_get_quiz_fail(self):
@@ -1,7 +1,9 @@
 import os
+import time
+import json
+import hashlib
 from flask import Flask, request, jsonify, abort
 from sqlalchemy import exc
-import json
 from flask_cors import CORS
 
 from .database.models import db_drop_and_create_all, setup_db, Drink
@@ -20,11 +22,45 @@ the following line to initialize the datbase
 # db_drop_and_create_all()
 
 
+'''
+menu snapshot
+    the encoded GET /drinks response and its ETag (a hash of the body),
+    dropped by every write to the drinks and rebuilt by the next read,
+    which is served without a query until then.
+    another process's writes are picked up after MENU_MAX_AGE seconds.
+'''
+MENU_MAX_AGE = 60
+menu = {'body': None, 'etag': None, 'built_at': None}
+
+
+def rebuild_menu():
+    body = json.dumps({
+        'success': True,
+        'drinks': [drink.short() for drink in Drink.query.all()]
+    }, sort_keys=True).encode()
+
+    menu.update({
+        'body': body,
+        'etag': hashlib.sha256(body).hexdigest(),
+        'built_at': time.monotonic()
+    })
+    return menu
+
+
+def get_menu():
+    if (menu['body'] is None
+            or time.monotonic() - menu['built_at'] > MENU_MAX_AGE):
+        return rebuild_menu()
+    return menu
+
+
 # ROUTES
 '''
 GET /drinks endpoint
     a public endpoint
     contain only the drink.short() data representation
+    served from the menu snapshot, with an ETag:
+        If-None-Match with the current ETag gets a 304
 returns
     status code 200
     json {"success": True, "drinks": drinks} where drinks is list of drinks
@@ -34,12 +70,16 @@ returns
 
 @app.route('/drinks')
 def get_drinks():
-    drinks = Drink.query.all()
+    snapshot = get_menu()
 
-    return jsonify({
-        'success': True,
-        'drinks': [drink.short() for drink in drinks]
-    })
+    if snapshot['etag'] in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(
+            snapshot['body'], mimetype='application/json')
+
+    response.set_etag(snapshot['etag'])
+    return response
 
 
 '''
@@ -83,17 +123,20 @@ def post_drink(payload):
     _request = request.get_json()
 
     try:
-        recipe = json.dumps(_request['recipe'])
-
         drink = Drink(
             title=_request['title'],
-            recipe=recipe
+            recipe=_request['recipe']
         )
         drink.insert()
 
+    except ValueError:
+        abort(422)
+
     except Exception:
         abort(400)
 
+    menu['body'] = None
+
     return jsonify({
         'success': True,
         'drink': drink.long()
@@ -124,13 +167,18 @@ def patch_drink(payload, id):
 
     _request = request.get_json()
 
-    if 'title' in _request:
-        drink.title = _request['title']
+    try:
+        if 'title' in _request:
+            drink.title = _request['title']
+
+        if 'recipe' in _request:
+            drink.recipe = _request['recipe']
 
-    if 'recipe' in _request:
-        drink.recipe = json.dumps(_request['recipe'])
+    except ValueError:
+        abort(422)
 
     drink.update()
+    menu['body'] = None
 
     return jsonify({
         'success': True,
@@ -160,6 +208,7 @@ def delete_drink(payload, id):
         abort(404)
 
     drink.delete()
+    menu['body'] = None
 
     return jsonify({
         'success': True,
@@ -174,7 +223,7 @@ Example error handling for unprocessable entity
 
 
 @app.errorhandler(422)
-def unprocessable():
+def unprocessable(error):
     return jsonify({
         "success": False,
         "error": 422,
@@ -188,7 +237,7 @@ error handler for 404
 
 
 @app.errorhandler(404)
-def not_found():
+def not_found(error):
     return jsonify({
         "success": False,
         "error": 404,
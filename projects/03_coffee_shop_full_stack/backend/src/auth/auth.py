@@ -1,13 +1,32 @@
+import os
 import json
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+from .jwks import JWKSStore, url_source, file_source
+from .token_cache import TokenCache
+from .permissions import permission_set, compile_permission
 
 
 AUTH0_DOMAIN = 'koffee-shop.eu.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'coffee'
+# a local copy of the key set (e.g. a test fixture) instead of Auth0's
+JWKS_FILE = os.environ.get('JWKS_FILE')
+
+'''
+signing keys of AUTH0_DOMAIN, fetched once and refreshed in the background
+'''
+jwks = JWKSStore(
+    file_source(JWKS_FILE) if JWKS_FILE else
+    url_source('https://' + AUTH0_DOMAIN + '/.well-known/jwks.json'))
+
+'''
+(payload, permission set) of verified tokens, so a client reusing its
+token skips the signature check until the token expires
+'''
+verified_tokens = TokenCache()
 
 
 # AuthError Exception
@@ -71,27 +90,32 @@ def get_token_auth_header():
 '''
 check_permissions(permission, payload) method
     @INPUTS
-        permission: string permission (i.e. 'post:drink')
+        permission: permission expression (i.e. 'post:drink',
+            'post:*', any_of('patch:drinks', 'delete:drinks'))
         payload: decoded jwt payload
+        permissions: the payload's permission set, if already built
 
     if permissions are not included in the payload
         it raises an AuthError
-    if the requested permission string is not in the payload permissions array
+    if the payload permissions do not satisfy the expression
         it raises an AuthError
 
     return true otherwise
 '''
 
 
-def check_permissions(permission, payload):
+def check_permissions(permission, payload, permissions=None):
     '''check the 'permissions' key in the payload'''
-    if 'permissions' not in payload:
+    if permissions is None:
+        permissions = permission_set(payload)
+
+    if permissions is None:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'permissions should be included'
             }, 401)
 
-    if permission not in payload['permissions']:
+    if not compile_permission(permission)(permissions):
         raise AuthError({
             'code': 'unauthorized',
             'description': 'Permission Not found'
@@ -107,32 +131,51 @@ verify_decode_jwt(token) method
 
     it should be an Auth0 token with key id (kid)
     it should verify the token using Auth0 /.well-known/jwks.json
+        (through the jwks key store, not a fetch per request)
     it should decode the payload from the token
     it should validate the claims
     return the decoded payload
+        (tokens verified before come from verified_tokens)
 '''
 
 
 def verify_decode_jwt(token):
-    json_url = urlopen('https://' + AUTH0_DOMAIN + '/.well-known/jwks.json')
-    jwks = json.loads(json_url.read())
+    return verify_token(token)[0]
+
+
+'''
+verify_token(token) method
+    verify_decode_jwt() that also returns the payload's permission set,
+    both are cached in verified_tokens until the token expires
+'''
+
+
+def verify_token(token):
+    entry = verified_tokens.get(token)
+    if entry is not None:
+        return entry
+
+    payload = decode_jwt(token)
+    entry = (payload, permission_set(payload))
+    verified_tokens.set(token, entry, payload.get('exp'))
+    return entry
+
+
+def decode_jwt(token):
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = jwks.get(unverified_header['kid'])
+    if rsa_key is None and not jwks.available:
+        raise AuthError({
+            'code': 'jwks_unavailable',
+            'description': 'Unable to fetch the signing keys.'
+        }, 503)
+
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -170,28 +213,26 @@ def verify_decode_jwt(token):
 '''
 @requires_auth(permission) decorator method
     @INPUTS
-        permission: string permission (i.e. 'post:drink')
+        permission: permission expression (i.e. 'post:drink',
+            '*:drinks', all_of('get:drinks-detail', 'patch:drinks'))
 
     get the token using the get_token_auth_header method
-    decode the jwt using the verify_decode_jwt method
-    icheck the requested permission using the check_permissions method
+    verify the jwt using the verify_token method
+    check the requested permission using the check_permissions method
     return the decorator which passes the payload to the decorated method
 '''
 
 
 def requires_auth(permission=''):
+    check = compile_permission(permission)
+
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            if (check_permissions(permission, payload)):
-                return f(payload, *args, **kwargs)
-            else:
-                raise AuthError({
-                    'code': 'unauthorized',
-                    'description': 'Permission Not found'
-                    }, 401)
+            payload, permissions = verify_token(token)
+            check_permissions(check, payload, permissions)
+            return f(payload, *args, **kwargs)
 
         return wrapper
     return requires_auth_decorator
@@ -0,0 +1,117 @@
+import json
+import time
+from threading import Lock, Thread
+from urllib.request import urlopen
+
+
+# seconds between background refreshes of the key set
+JWKS_TTL = 3600
+# an unknown kid refetches the key set at most this often (seconds)
+JWKS_MIN_REFETCH_INTERVAL = 60
+# seconds a fetch of the key set may take
+JWKS_FETCH_TIMEOUT = 5
+
+
+'''
+JWKS sources
+    callables returning the parsed key set ({'keys': [...]}):
+    url_source() fetches it from the identity provider,
+    file_source() reads a local copy (offline use, tests, fixtures)
+'''
+
+
+def url_source(url, timeout=JWKS_FETCH_TIMEOUT):
+    def fetch():
+        with urlopen(url, timeout=timeout) as response:
+            return json.loads(response.read())
+    return fetch
+
+
+def file_source(path):
+    def fetch():
+        with open(path) as f:
+            return json.load(f)
+    return fetch
+
+
+'''
+JWKSStore
+    the signing keys of the key set by key id (kid).
+    the key set is fetched on first use and refreshed by a background
+    thread every `ttl` seconds, a failed refresh keeps the keys it has.
+    a kid that is not known (e.g. right after a key rotation) refetches
+    the key set on demand, at most once per `min_refetch_interval`,
+    so tokens with made up kids cannot hammer the provider.
+'''
+
+
+class JWKSStore:
+    def __init__(self, source, ttl=JWKS_TTL,
+                 min_refetch_interval=JWKS_MIN_REFETCH_INTERVAL):
+        self.source = source
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.keys = {}
+        self.fetched_at = None
+        # False until a fetch of the key set succeeded
+        self.available = False
+        self.lock = Lock()
+        self.refresher = None
+
+    def refresh(self):
+        '''fetch the key set and replace the keys, True on success'''
+        try:
+            jwks = self.source()
+            keys = {
+                key['kid']: {
+                    'kty': key['kty'],
+                    'kid': key['kid'],
+                    'use': key['use'],
+                    'n': key['n'],
+                    'e': key['e']
+                } for key in jwks['keys'] if 'kid' in key
+            }
+        except Exception:
+            return False
+        finally:
+            self.fetched_at = time.monotonic()
+
+        self.keys = keys
+        self.available = True
+        return True
+
+    def get(self, kid):
+        '''the rsa key with the key id kid, None if there is no such key'''
+        self.start()
+
+        key = self.keys.get(kid)
+        if key is not None:
+            return key
+
+        with self.lock:
+            # another request may have refetched while this one waited
+            key = self.keys.get(kid)
+            if key is None and (
+                    self.fetched_at is None
+                    or time.monotonic() - self.fetched_at
+                    >= self.min_refetch_interval):
+                self.refresh()
+                key = self.keys.get(kid)
+        return key
+
+    def start(self):
+        '''start the background refresh thread, once'''
+        if self.refresher is not None or not self.ttl:
+            return
+        with self.lock:
+            if self.refresher is None:
+                self.refresher = Thread(
+                    target=self.refresh_forever, name='jwks-refresh',
+                    daemon=True)
+                self.refresher.start()
+
+    def refresh_forever(self):
+        while True:
+            time.sleep(self.ttl)
+            with self.lock:
+                self.refresh()
@@ -0,0 +1,108 @@
+from itertools import product
+
+# permissions with more ':' separated parts are only matched exactly,
+# the wildcard forms of a permission grow as 2 ** parts
+MAX_WILDCARD_PARTS = 4
+
+
+'''
+permission sets
+    the 'permissions' claim of a payload as a frozenset, built once per
+    verified token. every permission is also stored with each combination
+    of its ':' separated parts replaced by '*', so a required 'post:*'
+    (any post permission) or '*:drinks' (anything on drinks) is a set
+    lookup like an exact permission.
+'''
+
+
+def expand(permission):
+    '''permission and its wildcard forms ('post:drinks' -> 'post:*', ...)'''
+    parts = permission.split(':')
+    if len(parts) == 2:
+        # the usual 'verb:resource', spelled out as it is the hot path
+        return (permission, parts[0] + ':*', '*:' + parts[1], '*:*')
+    if len(parts) > MAX_WILDCARD_PARTS:
+        return (permission,)
+    return [':'.join('*' if wild else part
+                     for part, wild in zip(parts, mask))
+            for mask in product((False, True), repeat=len(parts))]
+
+
+def permission_set(payload):
+    '''frozenset of the payload's permissions, None if it has none'''
+    if 'permissions' not in payload:
+        return None
+    return frozenset(wildcard for permission in payload['permissions']
+                     for wildcard in expand(permission))
+
+
+'''
+permission expressions
+    what a route requires: a permission string ('get:drinks-detail',
+    wildcards allowed), any_of(...) or all_of(...) of expressions.
+    expressions are compiled once, when the route is decorated,
+    into a check over a permission set.
+'''
+
+
+class any_of:
+    def __init__(self, *expressions):
+        self.checks = [compile_permission(e) for e in expressions]
+
+    def __call__(self, permissions):
+        return any(check(permissions) for check in self.checks)
+
+
+class all_of:
+    def __init__(self, *expressions):
+        self.checks = [compile_permission(e) for e in expressions]
+
+    def __call__(self, permissions):
+        return all(check(permissions) for check in self.checks)
+
+
+def compile_permission(expression):
+    '''check(permission set) -> bool for an expression'''
+    if isinstance(expression, str):
+        return lambda permissions: expression in permissions
+    if callable(expression):
+        return expression
+    raise TypeError('not a permission expression: {!r}'.format(expression))
+
+
+'''
+benchmark
+    permission checks against tokens with hundreds of permissions,
+    the list scan of the payload claim vs a precompiled check over the set.
+    run with: python -m src.auth.permissions
+'''
+
+
+def benchmark(sizes=(10, 100, 500), repeat=20000):
+    import timeit
+
+    for size in sizes:
+        claim = ['read:resource-{}'.format(i) for i in range(size)]
+        claim.append('post:drinks')
+        payload = {'permissions': claim}
+        permissions = permission_set(payload)
+
+        exact = compile_permission('post:drinks')
+        either = compile_permission(any_of('patch:drinks', '*:drinks'))
+
+        runs = [
+            ('list scan', repeat,
+             lambda: 'post:drinks' in payload['permissions']),
+            ('set lookup', repeat, lambda: exact(permissions)),
+            ('set any_of + wildcard', repeat, lambda: either(permissions)),
+            ('build set (once per token)', repeat // 100,
+             lambda: permission_set(payload))
+        ]
+        for name, number, run in runs:
+            best = min(timeit.repeat(run, number=number, repeat=5)) / number
+            print('{:>5} permissions  {:<28}{:>10.3f} us'.format(
+                len(claim), name, best * 1e6))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,75 @@
+import time
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+
+# verified tokens kept before the least recently used is dropped
+TOKEN_CACHE_SIZE = 1024
+
+
+'''
+TokenCache
+    what was derived from tokens whose signature and claims were verified,
+    keyed by the sha256 of the token so raw tokens are not kept around.
+    an entry expires at the token's exp claim, after that the token goes
+    through jwt.decode again (and is rejected as expired).
+'''
+
+
+class TokenCache:
+    def __init__(self, max_entries=TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        '''the value cached for token, None if there is none'''
+        key = self.key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, token, value, exp):
+        '''cache value for a verified token until its exp claim'''
+        if not isinstance(exp, (int, float)) or not self.max_entries:
+            return
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = (value, exp)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
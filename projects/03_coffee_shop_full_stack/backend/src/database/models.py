@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, JSON
+from sqlalchemy.orm import validates
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -50,25 +51,42 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients - a native json column, stored as json text on sqlite
     # the required datatype is [{
     #                               'color': string,
     #                               'name':string,
     #                               'parts':number
     #                           }]
-    recipe = Column(String(180), nullable=False)
+    recipe = Column(JSON, nullable=False)
+
+    '''
+    recipe
+        accepts the recipe as a list, or as the json text the
+        column used to hold, which is parsed once here.
+        raises ValueError unless it is a list of ingredients
+        with (at least) a color and parts
+    '''
+    @validates('recipe')
+    def validate_recipe(self, key, recipe):
+        if isinstance(recipe, str):
+            recipe = json.loads(recipe)
+        if not isinstance(recipe, list) or not all(
+                isinstance(r, dict) and 'color' in r and 'parts' in r
+                for r in recipe):
+            raise ValueError(
+                'recipe must be a list of {color, name, parts} objects')
+        return recipe
 
     '''
     short()
         short form representation of the Drink model
     '''
     def short(self):
-        print(json.loads(self.recipe))
         short_recipe = [
             {
                 'color': r['color'],
                 'parts': r['parts']
-            } for r in json.loads(self.recipe)]
+            } for r in self.recipe]
 
         return {
             'id': self.id,
@@ -84,7 +102,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe
         }
 
     '''